@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Benchmark do Agno RAG com corpus sintético: ingestão, latência de busca, memória e reinício
+
+Mede o AgnoRAG no próprio processo (--target inprocess) e pela API HTTP, com o serviço iniciado
+pelo benchmark num subprocesso uvicorn (--target http). Cada tamanho roda num diretório de dados
+novo; o cache de resultados fica desligado (ENABLE_CACHE=false) para medir a busca em si. Variáveis
+como SEARCH_SHARDS e EMBEDDING_MODEL valem como no serviço. O resultado é um JSON para comparar
+entre commits (--compare).
+
+Uso (a partir de python-services/agno):
+    python benchmarks/agno_bench.py --sizes 1k 10k --output bench.json
+    python benchmarks/agno_bench.py --sizes 100k 1m --target inprocess --modes lexical
+    python benchmarks/agno_bench.py --compare antes.json depois.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+AGNO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(AGNO_DIR))
+
+from corpus import SIZES, Corpus  # noqa: E402
+
+INDEX = "bench"
+MODES = ("lexical", "vector", "hybrid")
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def latency_report(samples: List[float]) -> Dict[str, float]:
+    return {
+        "queries": len(samples),
+        "p50_ms": percentile_ms(samples, 50),
+        "p99_ms": percentile_ms(samples, 99),
+        "mean_ms": round(float(np.mean(samples)) * 1000, 3),
+    }
+
+
+def rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """Memória residente de um processo (Linux: /proc/<pid>/statm); None onde não há /proc"""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def directory_bytes(path: Path) -> int:
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+
+def git_commit() -> Optional[str]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=AGNO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", "."], cwd=AGNO_DIR, capture_output=True,
+                               text=True, check=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def batches(documents: Iterator[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ingest_report(seconds: float, corpus: Corpus) -> Dict[str, float]:
+    return {
+        "seconds": round(seconds, 3),
+        "documents_per_s": round(corpus.documents_count / seconds, 1),
+        "chunks_per_s": round(corpus.chunks / seconds, 1),
+    }
+
+
+async def run_inprocess(corpus: Corpus, queries: List[str], args, workdir: Path) -> Dict[str, Any]:
+    """Ingestão, buscas e reinício chamando o AgnoRAG diretamente (sem HTTP)"""
+    import main
+    os.chdir(workdir)
+
+    rag = main.AgnoRAG()
+    await rag.initialize()
+    await rag.wait_model()
+    await rag.create_index(INDEX, "Benchmark")
+    rss_before = rss_bytes()
+
+    started = time.perf_counter()
+    for batch in batches(corpus.documents(), args.batch_size):
+        await rag.add_documents(INDEX, batch)
+    ingest = ingest_report(time.perf_counter() - started, corpus)
+
+    async def measure(mode: str) -> List[float]:
+        samples = []
+        for number, query in enumerate(queries):
+            started = time.perf_counter()
+            await rag.search(INDEX, query, limit=args.limit, mode=mode)
+            if number >= args.warmup:
+                samples.append(time.perf_counter() - started)
+        return samples
+
+    search, skipped = {}, {}
+    for mode in args.modes:
+        if rag.search_mode(mode) != mode:
+            skipped[mode] = "sem modelo de embeddings"
+            continue
+        search[mode] = latency_report(await measure(mode))
+
+    stats = await rag.get_index_stats(INDEX)
+    rss_after = rss_bytes()
+    await rag.shutdown()
+    memory = {
+        "rss_bytes": rss_after,
+        "rss_growth_bytes": rss_after - rss_before if rss_after is not None and rss_before is not None else None,
+        "vector_memory_bytes": stats["vector_memory_bytes"],
+        "vector_mapped_bytes": stats["vector_mapped_bytes"],
+        "disk_bytes": directory_bytes(rag.data_dir),
+    }
+
+    # Reinício: recarregar o índice persistido (SQLite, vetores mapeados e HNSW) num AgnoRAG novo;
+    # a busca lexical responde ao fim de initialize, a vetorial depois do modelo carregar
+    started = time.perf_counter()
+    restarted = main.AgnoRAG()
+    await restarted.initialize()
+    lexical_seconds = time.perf_counter() - started
+    await restarted.wait_model()
+    restart_seconds = time.perf_counter() - started
+    documents = len(restarted.documents.get(INDEX, {}))
+    await restarted.shutdown()
+
+    return {
+        "chunks": stats["chunks"],
+        "documents": stats["documents"],
+        "embeddings": rag.encoder is not None,
+        "ingest": ingest,
+        "search": search,
+        "skipped": skipped,
+        "memory": memory,
+        "restart_lexical_seconds": round(lexical_seconds, 3),
+        "restart_seconds": round(restart_seconds, 3),
+        "restart_documents": documents,
+    }
+
+
+class Server:
+    """Serviço Agno num subprocesso uvicorn, com os dados em `workdir`"""
+
+    def __init__(self, workdir: Path, timeout: float):
+        self.workdir = workdir
+        self.timeout = timeout
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            self.port = probe.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.process = None
+
+    def start(self) -> Tuple[float, float]:
+        """Iniciar e esperar o serviço ficar pronto com o modelo carregado; retorna os segundos até
+        /health/live e até /health/ready?require_model=true responderem 200"""
+        started = time.perf_counter()
+        log = open(self.workdir / "server.log", "ab")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", str(AGNO_DIR),
+             "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"],
+            cwd=self.workdir, stdout=log, stderr=subprocess.STDOUT
+        )
+        log.close()
+        live = None
+        while time.perf_counter() - started < self.timeout:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Servidor encerrou ao iniciar (veja {self.workdir / 'server.log'})")
+            try:
+                if live is None:
+                    if httpx.get(f"{self.url}/health/live", timeout=1.0).status_code == 200:
+                        live = time.perf_counter() - started
+                        continue
+                elif httpx.get(f"{self.url}/health/ready", params={"require_model": "true"},
+                               timeout=1.0).status_code == 200:
+                    return live, time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            time.sleep(0.05)
+        raise RuntimeError(f"Servidor não respondeu em {self.timeout:.0f}s (veja {self.workdir / 'server.log'})")
+
+    def stop(self):
+        """Encerramento limpo (SIGTERM: o log de escrita é aplicado ao SQLite)"""
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+def run_http(corpus: Corpus, queries: List[str], args, workdir: Path) -> Dict[str, Any]:
+    """Mesmas medições pela API HTTP (ingestão em NDJSON por /documents/batch)"""
+    server = Server(workdir, args.server_timeout)
+    try:
+        server.start()
+        with httpx.Client(base_url=server.url, timeout=None) as client:
+            client.post("/indices", json={"name": INDEX, "description": "Benchmark"}).raise_for_status()
+            embeddings = client.get("/health").json()["services"]["embeddings"] == "loaded"
+            rss_before = rss_bytes(server.process.pid)
+
+            def lines() -> Iterator[bytes]:
+                for document in corpus.documents():
+                    yield (json.dumps({"index": INDEX, **document}, ensure_ascii=False) + "\n").encode("utf-8")
+
+            started = time.perf_counter()
+            response = client.post("/documents/batch", content=lines(),
+                                   headers={"Content-Type": "application/x-ndjson"})
+            response.raise_for_status()
+            ingest = ingest_report(time.perf_counter() - started, corpus)
+            done = json.loads(response.text.strip().splitlines()[-1])
+            if done.get("errors"):
+                raise RuntimeError(f"{done['errors']} documentos com erro na ingestão (veja {workdir / 'server.log'})")
+
+            def measure(mode: str):
+                samples, server_samples = [], []
+                for number, query in enumerate(queries):
+                    started = time.perf_counter()
+                    response = client.post("/search", json={"index": INDEX, "query": query, "limit": args.limit,
+                                                            "mode": mode})
+                    elapsed = time.perf_counter() - started
+                    response.raise_for_status()
+                    if number >= args.warmup:
+                        samples.append(elapsed)
+                        server_samples.append(response.json()["timings"]["total"] / 1000)
+                return samples, server_samples
+
+            search, skipped = {}, {}
+            for mode in args.modes:
+                if mode != "lexical" and not embeddings:
+                    skipped[mode] = "sem modelo de embeddings"
+                    continue
+                samples, server_samples = measure(mode)
+                report = latency_report(samples)
+                server_report = latency_report(server_samples)
+                report["server_p50_ms"] = server_report["p50_ms"]
+                report["server_p99_ms"] = server_report["p99_ms"]
+                search[mode] = report
+
+            stats = client.get(f"/indices/{INDEX}/stats").json()["stats"]
+            rss_after = rss_bytes(server.process.pid)
+
+        server.stop()
+        memory = {
+            "rss_bytes": rss_after,
+            "rss_growth_bytes": rss_after - rss_before if rss_after is not None and rss_before is not None else None,
+            "vector_memory_bytes": stats["vector_memory_bytes"],
+            "vector_mapped_bytes": stats["vector_mapped_bytes"],
+            "disk_bytes": directory_bytes(workdir / "data" / "agno"),
+        }
+
+        # Reinício: processo novo até /health/live (importação) e até ficar pronto (recarga do índice e modelo)
+        live_seconds, restart_seconds = server.start()
+        documents = httpx.get(f"{server.url}/indices/{INDEX}/stats", timeout=None).json()["stats"]["documents"]
+    finally:
+        server.stop()
+
+    return {
+        "chunks": stats["chunks"],
+        "documents": stats["documents"],
+        "embeddings": embeddings,
+        "ingest": ingest,
+        "search": search,
+        "skipped": skipped,
+        "memory": memory,
+        "restart_live_seconds": round(live_seconds, 3),
+        "restart_seconds": round(restart_seconds, 3),
+        "restart_documents": documents,
+    }
+
+
+def flatten(value: Any, prefix: str = "") -> Dict[str, float]:
+    if isinstance(value, dict):
+        items = {}
+        for key, item in value.items():
+            items.update(flatten(item, f"{prefix}.{key}" if prefix else key))
+        return items
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+    return {}
+
+
+def compare(before_path: Path, after_path: Path):
+    """Imprimir a variação de cada métrica entre dois resultados (mesmo alvo e tamanho)"""
+    before = json.loads(before_path.read_text(encoding="utf-8"))
+    after = json.loads(after_path.read_text(encoding="utf-8"))
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    runs = {(run["target"], run["size"]): run for run in before["runs"]}
+    for run in after["runs"]:
+        previous = runs.get((run["target"], run["size"]))
+        if previous is None:
+            continue
+        print(f"\n[{run['target']} {run['size']}]")
+        old_metrics = flatten(previous)
+        for name, value in flatten(run).items():
+            old = old_metrics.get(name)
+            if old is None or name in ("chunks", "documents", "restart_documents") or name.endswith("queries"):
+                continue
+            change = f"{(value - old) / old * 100:+.1f}%" if old else "n/a"
+            print(f"  {name:40} {old:>14} -> {value:<14} {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["1k", "10k"],
+                        help="Tamanhos do corpus em chunks: 1k, 10k, 100k, 1m ou um número")
+    parser.add_argument("--target", nargs="+", choices=["inprocess", "http"], default=["inprocess", "http"])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10, help="Consultas iniciais fora das estatísticas")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=64, help="Documentos por chamada na ingestão em processo")
+    parser.add_argument("--sections", type=int, default=4, help="Chunks por documento")
+    parser.add_argument("--words", type=int, default=80, help="Palavras por chunk")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cache", action="store_true", help="Manter o cache de resultados ligado")
+    parser.add_argument("--data-root", type=Path, help="Onde criar os diretórios de dados (padrão: temporário)")
+    parser.add_argument("--keep", action="store_true", help="Não apagar os diretórios de dados")
+    parser.add_argument("--server-timeout", type=float, default=300.0)
+    parser.add_argument("--output", type=Path, help="Gravar resultados em JSON")
+    parser.add_argument("--compare", nargs=2, type=Path, metavar=("ANTES", "DEPOIS"),
+                        help="Comparar dois resultados gravados e sair")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    # Antes do main.py: sem logs por documento e por busca no terminal (o servidor HTTP grava os seus em server.log)
+    logging.basicConfig(level=logging.WARNING)
+    if not args.cache:
+        os.environ["ENABLE_CACHE"] = "false"
+    home = Path.cwd()
+    scratch = Path(tempfile.mkdtemp(prefix="agno-bench-", dir=args.data_root))
+    # O AgnoRAG (e ./data/agno) é criado no startup, no diretório corrente: cada alvo roda no seu workdir
+    # (servidor com cwd=workdir, run_inprocess após chdir); o resto fica no diretório temporário
+    os.chdir(scratch)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "queries": args.queries, "warmup": args.warmup, "limit": args.limit, "batch_size": args.batch_size,
+            "sections": args.sections, "words": args.words, "seed": args.seed, "cache": args.cache,
+            "search_shards": int(os.getenv("SEARCH_SHARDS", "0")),
+            "embedding_model": os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"),
+        },
+        "runs": [],
+    }
+
+    try:
+        for size in args.sizes:
+            chunks = SIZES[size.lower()] if size.lower() in SIZES else int(size)
+            corpus = Corpus(chunks, sections=args.sections, words=args.words, seed=args.seed)
+            queries = corpus.queries(args.queries + args.warmup)
+            for target in args.target:
+                workdir = scratch / f"{target}-{size}"
+                workdir.mkdir()
+                print(f"{target} {size}: {chunks} chunks em {corpus.documents_count} documentos...", file=sys.stderr)
+                started = time.perf_counter()
+                if target == "inprocess":
+                    result = asyncio.run(run_inprocess(corpus, queries, args, workdir))
+                    os.chdir(scratch)
+                else:
+                    result = run_http(corpus, queries, args, workdir)
+                report["runs"].append({"target": target, "size": size, **result,
+                                       "wall_seconds": round(time.perf_counter() - started, 1)})
+                if not args.keep:
+                    shutil.rmtree(workdir, ignore_errors=True)
+    finally:
+        os.chdir(home)
+        if not args.keep:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(output, encoding="utf-8")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark de recall x latência do HNSW contra a busca exata do VectorStore
+
+Uso (a partir de python-services/agno):
+    python benchmarks/ann_recall.py --vectors 20000 --dim 384 --queries 200
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from hnsw import HNSWIndex  # noqa: E402
+from vector_store import VectorStore, normalize_rows  # noqa: E402
+
+
+def clustered_vectors(rng: np.random.Generator, centers: np.ndarray, count: int) -> np.ndarray:
+    """Vetores sintéticos agrupados em torno de `centers` (mais próximos de embeddings reais que
+    ruído uniforme)"""
+    labels = rng.integers(0, len(centers), size=count)
+    return centers[labels] + 0.35 * rng.normal(size=(count, centers.shape[1])).astype(np.float32)
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=100)
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="Gravar resultados em JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centers = rng.normal(size=(max(args.vectors // 500, 8), args.dim)).astype(np.float32)
+    data = clustered_vectors(rng, centers, args.vectors)
+    # Consultas da mesma distribuição dos dados (mesmos centros): o recall medido é o do índice,
+    # não o de consultas fora de qualquer cluster
+    queries = normalize_rows(clustered_vectors(rng, centers, args.queries))
+
+    store = VectorStore(args.dim)
+    store.add(range(args.vectors), data)
+
+    ann = HNSWIndex(store.vectors_at, M=args.m, ef_construction=args.ef_construction)
+    started = time.perf_counter()
+    for position in range(len(store)):
+        ann.add(position, store.vectors_at([position])[0])
+    build_seconds = time.perf_counter() - started
+
+    exact = []
+    exact_times = []
+    for query in queries:
+        started = time.perf_counter()
+        ids, _ = store.search(query, args.k)
+        exact_times.append(time.perf_counter() - started)
+        exact.append(set(ids.tolist()))
+
+    report = {
+        "vectors": args.vectors,
+        "dim": args.dim,
+        "queries": args.queries,
+        "k": args.k,
+        "M": args.m,
+        "ef_construction": args.ef_construction,
+        "build_seconds": round(build_seconds, 2),
+        "exact": {"p50_ms": percentile_ms(exact_times, 50), "p99_ms": percentile_ms(exact_times, 99)},
+        "hnsw": [],
+    }
+
+    for ef in args.ef:
+        recalls = []
+        times = []
+        for query, truth in zip(queries, exact):
+            started = time.perf_counter()
+            positions, _ = ann.search(query, args.k, ef=ef)
+            times.append(time.perf_counter() - started)
+            recalls.append(len(truth & set(store.ids_at(positions).tolist())) / args.k)
+        report["hnsw"].append({
+            "ef": ef,
+            "recall": round(float(np.mean(recalls)), 4),
+            "p50_ms": percentile_ms(times, 50),
+            "p99_ms": percentile_ms(times, 99),
+        })
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output, encoding="utf-8")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Corpus sintético e determinístico (português e inglês) para os benchmarks do Agno RAG
+
+Cada documento tem `sections` seções markdown ("## ..."); com os parâmetros de chunking padrão
+cada seção vira exatamente um chunk, então o tamanho do corpus é dado em chunks. As palavras seguem
+uma distribuição de Zipf sobre um vocabulário fixo por idioma (termos raros e frequentes, como em
+texto real). A mesma semente gera sempre os mesmos documentos e consultas, em qualquer máquina.
+"""
+
+import itertools
+import random
+from typing import Dict, Iterator, List
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+VOCABULARY = {
+    "pt": (
+        "marketing digital conteúdo vendas funil cliente produto curso ebook capítulo estratégia "
+        "público campanha anúncio tráfego orgânico pago conversão página captura lista email "
+        "automação roteiro aula módulo aluno professor mentoria comunidade lançamento oferta preço "
+        "desconto bônus garantia depoimento autoridade nicho mercado concorrência pesquisa palavra "
+        "chave busca ranking métrica resultado receita lucro margem custo investimento retorno "
+        "planejamento calendário publicação rede social vídeo imagem texto título descrição "
+        "engajamento seguidor audiência marca posicionamento identidade voz tom persona dor desejo "
+        "objeção solução benefício característica diferencial proposta valor jornada compra etapa "
+        "descoberta consideração decisão fidelização indicação parceria afiliado comissão plataforma "
+        "hospedagem domínio site blog artigo podcast entrevista webinar evento ao vivo gravação "
+        "edição design capa diagramação revisão escrita pesquisa fonte referência exemplo exercício "
+        "prática teoria conceito método processo ferramenta modelo template checklist guia manual "
+        "projeto meta prazo tarefa equipe gestão liderança produtividade hábito rotina foco tempo"
+    ).split(),
+    "en": (
+        "marketing digital content sales funnel customer product course ebook chapter strategy "
+        "audience campaign ad traffic organic paid conversion landing page list email automation "
+        "outline lesson module student teacher mentoring community launch offer price discount "
+        "bonus guarantee testimonial authority niche market competition research keyword search "
+        "ranking metric result revenue profit margin cost investment return planning calendar "
+        "publishing social network video image text title description engagement follower brand "
+        "positioning identity voice tone persona pain desire objection solution benefit feature "
+        "differentiator value proposition journey purchase stage discovery consideration decision "
+        "loyalty referral partnership affiliate commission platform hosting domain website blog "
+        "article podcast interview webinar event live recording editing design cover layout review "
+        "writing source reference example exercise practice theory concept method process tool "
+        "model template checklist guide manual project goal deadline task team management "
+        "leadership productivity habit routine focus time"
+    ).split(),
+}
+
+CONNECTIVES = {
+    "pt": "de a o que e do da em um para com uma os no se na por mais as dos como mas ao ele das".split(),
+    "en": "the of and to a in is that for it as with was on be at by this have from or an but not".split(),
+}
+
+TOPICS = 16
+
+
+class Corpus:
+    """Gerador determinístico de documentos e consultas"""
+
+    def __init__(self, chunks: int, sections: int = 4, words: int = 80, seed: int = 42):
+        self.chunks = chunks
+        self.sections = sections
+        self.words = words
+        self.seed = seed
+        # Pesos de Zipf (1/posição) por idioma, calculados uma vez
+        self._weights = {lang: list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+                         for lang, vocabulary in VOCABULARY.items()}
+
+    @property
+    def documents_count(self) -> int:
+        return -(-self.chunks // self.sections)
+
+    def _words(self, rng: random.Random, lang: str, count: int) -> List[str]:
+        return rng.choices(VOCABULARY[lang], cum_weights=self._weights[lang], k=count)
+
+    def _sentence(self, rng: random.Random, lang: str) -> str:
+        words = []
+        for word in self._words(rng, lang, rng.randint(6, 14)):
+            words.append(word)
+            if rng.random() < 0.4:
+                words.append(rng.choice(CONNECTIVES[lang]))
+        return " ".join(words).capitalize() + "."
+
+    def document(self, number: int) -> Dict:
+        """Documento `number` (independe dos demais: pode ser gerado em qualquer ordem)"""
+        rng = random.Random(f"{self.seed}:{number}")
+        lang = "pt" if number % 2 == 0 else "en"
+        sections = min(self.sections, self.chunks - number * self.sections)
+        parts = []
+        for section in range(sections):
+            title = " ".join(self._words(rng, lang, 3)).title()
+            sentences = []
+            words = 0
+            while words < self.words:
+                sentence = self._sentence(rng, lang)
+                sentences.append(sentence)
+                words += len(sentence.split())
+            parts.append(f"## {title}\n\n{' '.join(sentences)}")
+        return {
+            "document_id": f"doc-{number}",
+            "content": "\n\n".join(parts),
+            "metadata": {"lang": lang, "topic": number % TOPICS, "project_id": number // 100},
+        }
+
+    def documents(self) -> Iterator[Dict]:
+        return (self.document(number) for number in range(self.documents_count))
+
+    def queries(self, count: int) -> List[str]:
+        """Consultas distintas de 1 a 3 termos (o cache de rankings não mascara a latência)"""
+        rng = random.Random(f"{self.seed}:queries")
+        queries = {}
+        while len(queries) < count:
+            lang = rng.choice(("pt", "en"))
+            queries.setdefault(" ".join(self._words(rng, lang, rng.randint(1, 3))), None)
+        return list(queries)
@@ -0,0 +1,143 @@
+"""
+Caches do Agno RAG
+- LRUCache: cache em memória com contadores de acerto
+- EmbeddingCache: embeddings por hash do (texto normalizado, modelo), em memória (LRU) e em disco (SQLite)
+"""
+
+import hashlib
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    # EmbeddingCache só é usado com modelo de embeddings (que exige numpy)
+    np = None
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+class LRUCache:
+    """Dicionário limitado que descarta o item usado há mais tempo"""
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self._items: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key: Hashable, default=None):
+        try:
+            value = self._items[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._items),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class EmbeddingCache:
+    """Embeddings de chunks compartilhados entre índices, para nunca codificar o mesmo texto duas vezes"""
+
+    def __init__(self, path: Optional[Path], memory_entries: int = 10000):
+        self.memory = LRUCache(memory_entries)
+        self.disk_hits = 0
+        self.misses = 0
+        self.conn = None
+        self._lock = threading.Lock()
+        if path is not None:
+            self.conn = sqlite3.connect(str(path), check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+
+    @staticmethod
+    def key(text: str, model: str) -> str:
+        """Hash do texto normalizado (espaços colapsados) + nome do modelo"""
+        normalized = WHITESPACE_RE.sub(" ", text).strip()
+        return hashlib.sha1(f"{model}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> List[Optional["np.ndarray"]]:
+        """Buscar vetores no nível em memória (None para os ausentes). Os ausentes são lidos do
+        disco com `read_many`, fora do event loop, e promovidos com `promote`."""
+        return [self.memory.get(key) for key in keys]
+
+    def read_many(self, keys: List[str]) -> Dict[str, "np.ndarray"]:
+        """Ler do disco os vetores de `keys` que existirem (consulta SQLite; pode rodar numa thread)"""
+        found = {}
+        if self.conn is None or not keys:
+            return found
+        wanted = list(set(keys))
+        with self._lock:
+            # Limite de variáveis do SQLite: consultar em blocos
+            for start in range(0, len(wanted), 500):
+                block = wanted[start:start + 500]
+                placeholders = ",".join("?" * len(block))
+                for key, blob in self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", block
+                ):
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def promote(self, found: Dict[str, "np.ndarray"]):
+        """Trazer para a memória vetores lidos do disco"""
+        for key, vector in found.items():
+            self.memory.put(key, vector)
+        self.disk_hits += len(found)
+
+    def put_many(self, keys: List[str], vectors: "np.ndarray"):
+        """Guardar em memória vetores recém-calculados pelo modelo (o disco fica para `write_many`)"""
+        for key, vector in zip(keys, np.asarray(vectors, dtype=np.float32)):
+            self.memory.put(key, vector)
+        self.misses += len(keys)
+
+    def write_many(self, keys: List[str], vectors: "np.ndarray"):
+        """Gravar vetores no disco (transação SQLite; pode rodar numa thread)"""
+        if self.conn is None:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, vector.tobytes()) for key, vector in zip(keys, vectors)],
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        memory_hits = self.memory.hits
+        lookups = memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_entries": len(self.memory),
+            "memory_hits": memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
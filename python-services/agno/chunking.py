@@ -0,0 +1,131 @@
+"""
+Chunking do Agno RAG orientado à estrutura do texto
+Divide por títulos markdown, depois parágrafos, depois frases e só então por janelas de palavras.
+Os chunks são emitidos como offsets (início, fim) à medida que o texto é percorrido (gerador),
+sem listas de palavras nem cópias de substrings.
+"""
+
+import re
+from collections import Counter, deque
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from documents import chunk_hash
+from lexical_index import tokenize
+
+WORD_RE = re.compile(r"\S+")
+
+# Níveis de divisão, do mais grosso ao mais fino; cada padrão casa o separador entre dois trechos
+HEADING_RE = re.compile(r"^(?=#{1,6}[ \t])", re.MULTILINE)
+PARAGRAPH_RE = re.compile(r"\n[ \t]*\n\s*")
+SENTENCE_RE = re.compile(r"(?<=[.!?…])[\"'”»)\]]*\s+")
+SPLIT_LEVELS = (PARAGRAPH_RE, SENTENCE_RE)
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 200
+
+Unit = Tuple[int, int, int]  # (início, fim, palavras)
+
+
+def _pieces(text: str, start: int, end: int, separator: re.Pattern) -> Iterator[Tuple[int, int]]:
+    """Trechos de text[start:end] entre as ocorrências de `separator`"""
+    position = start
+    for match in separator.finditer(text, start, end):
+        if match.start() > position:
+            yield position, match.start()
+        position = max(position, match.end())
+    if position < end:
+        yield position, end
+
+
+def _measure(text: str, start: int, end: int) -> Optional[Unit]:
+    """Recortar espaços das pontas e contar palavras; None se o trecho estiver vazio"""
+    first = last = None
+    words = 0
+    for match in WORD_RE.finditer(text, start, end):
+        if first is None:
+            first = match.start()
+        last = match.end()
+        words += 1
+    if first is None:
+        return None
+    return first, last, words
+
+
+def _units(text: str, start: int, end: int, chunk_size: int, level: int = 0) -> Iterator[Unit]:
+    """Unidades de até `chunk_size` palavras: parágrafos, frases ou, em último caso, palavras"""
+    if level == len(SPLIT_LEVELS):
+        for match in WORD_RE.finditer(text, start, end):
+            yield match.start(), match.end(), 1
+        return
+
+    for piece_start, piece_end in _pieces(text, start, end, SPLIT_LEVELS[level]):
+        unit = _measure(text, piece_start, piece_end)
+        if unit is None:
+            continue
+        if unit[2] <= chunk_size:
+            yield unit
+        else:
+            yield from _units(text, unit[0], unit[1], chunk_size, level + 1)
+
+
+def _pack(units: Iterator[Unit], chunk_size: int, overlap: int) -> Iterator[Tuple[int, int]]:
+    """Agrupar unidades consecutivas em chunks de até `chunk_size` palavras; cada chunk repete
+    as últimas unidades do anterior que couberem em `overlap` palavras"""
+    window: Deque[Unit] = deque()
+    words = 0
+    fresh = False  # a janela tem unidades ainda não emitidas
+
+    for unit in units:
+        if window and words + unit[2] > chunk_size:
+            if fresh:
+                yield window[0][0], window[-1][1]
+                fresh = False
+                # Manter só a sobreposição (sempre menor que o chunk emitido)
+                carried = 0
+                keep = 0
+                for _, _, unit_words in reversed(window):
+                    if carried + unit_words > overlap:
+                        break
+                    carried += unit_words
+                    keep += 1
+                while len(window) > keep:
+                    words -= window.popleft()[2]
+            # A sobreposição cede espaço se a próxima unidade não couber
+            while window and words + unit[2] > chunk_size:
+                words -= window.popleft()[2]
+
+        window.append(unit)
+        words += unit[2]
+        fresh = True
+
+    if fresh:
+        yield window[0][0], window[-1][1]
+
+
+def validate_chunk_settings(chunk_size: int, overlap: int):
+    if chunk_size <= 0 or not 0 <= overlap < chunk_size:
+        raise ValueError(f"Parâmetros de chunking inválidos: chunk_size={chunk_size}, chunk_overlap={overlap}")
+
+
+def iter_chunk_spans(text: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     overlap: int = DEFAULT_CHUNK_OVERLAP) -> Iterator[Tuple[int, int]]:
+    """Gerar os offsets (início, fim) dos chunks de `text`; tamanhos em palavras.
+    Títulos markdown sempre começam um novo chunk (sem sobreposição entre seções)."""
+    validate_chunk_settings(chunk_size, overlap)
+
+    for section_start, section_end in _pieces(text, 0, len(text), HEADING_RE):
+        yield from _pack(_units(text, section_start, section_end, chunk_size), chunk_size, overlap)
+
+
+def analyze_text(text: str, chunk_size: int = DEFAULT_CHUNK_SIZE, overlap: int = DEFAULT_CHUNK_OVERLAP
+                 ) -> Tuple[List[Tuple[int, int]], List[bytes], List[Dict[str, int]]]:
+    """Offsets, hash do conteúdo e frequência dos termos de cada chunk.
+    Função pura (roda no pool de processos para documentos grandes)."""
+    spans = list(iter_chunk_spans(text, chunk_size, overlap))
+    hashes = []
+    terms = []
+    for start, end in spans:
+        chunk = text[start:end]
+        hashes.append(chunk_hash(chunk))
+        terms.append(dict(Counter(tokenize(chunk))))
+    return spans, hashes, terms
@@ -0,0 +1,128 @@
+"""
+Representação compacta dos documentos em memória do Agno RAG
+- StoredDocument: registro com __slots__; os chunks são offsets (início, fim) no texto do documento
+- ChunkTable: mapa id do chunk -> (documento, ordinal) em arrays, sem uma tupla por chunk
+"""
+
+import hashlib
+from array import array
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class StoredDocument:
+    """Documento indexado; o texto é guardado uma única vez e os chunks são fatias sob demanda"""
+
+    __slots__ = ("id", "content", "metadata", "added_at", "embedding_model", "_spans", "chunk_ids")
+
+    def __init__(self, document_id: str, content: str, metadata: Optional[Dict[str, Any]], added_at: str,
+                 embedding_model: Optional[str], spans: Iterable[Tuple[int, int]] = ()):
+        self.id = document_id
+        self.content = content
+        self.metadata = metadata or {}
+        self.added_at = added_at
+        self.embedding_model = embedding_model
+        # Offsets intercalados [início0, fim0, início1, fim1, ...] (4 bytes cada)
+        self._spans = array("I", chain.from_iterable(spans))
+        # Id global (no índice) de cada chunk, na ordem dos ordinais; atribuído na indexação
+        self.chunk_ids = array("I")
+
+    def __len__(self):
+        return len(self._spans) // 2
+
+    @property
+    def spans(self) -> List[Tuple[int, int]]:
+        spans = self._spans
+        return [(spans[i], spans[i + 1]) for i in range(0, len(spans), 2)]
+
+    def chunk(self, ordinal: int) -> str:
+        """Texto do chunk `ordinal` (fatia criada na hora, não armazenada)"""
+        return self.content[self._spans[2 * ordinal]:self._spans[2 * ordinal + 1]]
+
+    def chunks(self) -> Iterator[str]:
+        for ordinal in range(len(self)):
+            yield self.chunk(ordinal)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Formato de resposta da API (os chunks são materializados só aqui)"""
+        return {
+            "id": self.id,
+            "content": self.content,
+            "metadata": self.metadata,
+            "added_at": self.added_at,
+            "embedding_model": self.embedding_model,
+            "chunks": list(self.chunks()),
+        }
+
+    def to_record(self) -> Dict[str, Any]:
+        """Formato do log de escrita (offsets e ids em vez do texto de cada chunk)"""
+        return {
+            "id": self.id,
+            "content": self.content,
+            "metadata": self.metadata,
+            "added_at": self.added_at,
+            "embedding_model": self.embedding_model,
+            "spans": self._spans.tolist(),
+            "chunk_ids": self.chunk_ids.tolist(),
+        }
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "StoredDocument":
+        document = cls(record["id"], record["content"], record["metadata"], record["added_at"],
+                       record["embedding_model"])
+        document._spans.extend(record["spans"])
+        document.chunk_ids.extend(record["chunk_ids"])
+        return document
+
+
+def chunk_hash(text: str) -> bytes:
+    """Hash do conteúdo de um chunk (para reaproveitar chunks inalterados entre versões)"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class ChunkTable:
+    """Mapa id do chunk -> (id do documento, ordinal) em arrays paralelos"""
+
+    __slots__ = ("_documents", "_ordinals")
+
+    def __init__(self):
+        # Referências à mesma string de id do documento (não cópias); None = id obsoleto
+        self._documents: List[Optional[str]] = []
+        self._ordinals = array("I")
+
+    def __len__(self):
+        return len(self._documents)
+
+    def allocate(self, count: int) -> List[int]:
+        """Reservar `count` ids novos no fim da tabela"""
+        first_id = len(self._documents)
+        self.reserve(first_id + count)
+        return list(range(first_id, first_id + count))
+
+    def reserve(self, size: int):
+        """Garantir que os próximos ids alocados sejam >= `size` (ids já usados por vetores obsoletos)"""
+        missing = size - len(self._documents)
+        if missing > 0:
+            self._documents.extend([None] * missing)
+            self._ordinals.extend([0] * missing)
+
+    def assign(self, document_id: str, chunk_ids: Iterable[int]):
+        """Apontar cada id para (documento, posição na sequência)"""
+        for ordinal, chunk_id in enumerate(chunk_ids):
+            # Ids recarregados do disco podem ter lacunas (chunks removidos)
+            self.reserve(chunk_id + 1)
+            self._documents[chunk_id] = document_id
+            self._ordinals[chunk_id] = ordinal
+
+    def release(self, chunk_id: int):
+        """Marcar um id como obsoleto (ignorado na busca)"""
+        self._documents[chunk_id] = None
+
+    def get(self, chunk_id: int) -> Optional[Tuple[str, int]]:
+        """(id do documento, ordinal) do chunk, ou None se o id não existe"""
+        if chunk_id >= len(self._documents):
+            return None
+        document_id = self._documents[chunk_id]
+        if document_id is None:
+            return None
+        return document_id, self._ordinals[chunk_id]
@@ -0,0 +1,116 @@
+"""
+Agendador de embeddings com micro-batching para o Agno RAG
+Agrupa textos de requisições concorrentes (ingestão e busca) num único encode em lote
+"""
+
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """Fila que coleta textos por alguns milissegundos (ou até `max_batch_size`) antes de codificar;
+    a janela só é aberta quando há requisições concorrentes"""
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray], max_batch_size: int = 64,
+                 max_wait_ms: float = 5.0, executor: Optional[ThreadPoolExecutor] = None):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        # Um único worker: o modelo processa um lote por vez
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="agno-embed")
+
+        self._queue: Deque[Tuple[List[str], asyncio.Future]] = deque()
+        self._queued_texts = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._last_batch = 0
+
+        self.batches = 0
+        self.texts = 0
+
+    async def encode(self, texts: List[str]) -> np.ndarray:
+        """Calcular embeddings de `texts`, compartilhando o lote com outras requisições"""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = loop.create_task(self._run())
+
+        future = loop.create_future()
+        self._queue.append((list(texts), future))
+        self._queued_texts += len(texts)
+        self._wakeup.set()
+        return await future
+
+    async def _run(self):
+        """Loop do worker: esperar o lote encher (ou o prazo expirar) e codificar"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._queue:
+                continue
+
+            # Janela curta para juntar requisições concorrentes: só se o lote anterior juntou mais de
+            # uma (como no commit em grupo do log). Uma requisição sozinha codifica na hora; as que
+            # chegam durante um encode formam o lote seguinte.
+            deadline = loop.time() + (self.max_wait if self._last_batch > 1 else 0)
+            while self._queued_texts < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                self._wakeup.clear()
+
+            batch = self._take_batch()
+            self._last_batch = len(batch)
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = await loop.run_in_executor(self.executor, self.encode_fn, texts)
+            except Exception as e:
+                logger.error(f"Erro ao calcular embeddings ({len(texts)} textos): {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                self.batches += 1
+                self.texts += len(texts)
+                offset = 0
+                for item_texts, future in batch:
+                    if not future.done():
+                        future.set_result(vectors[offset:offset + len(item_texts)])
+                    offset += len(item_texts)
+
+            if self._queue:
+                self._wakeup.set()
+
+    def _take_batch(self) -> List[Tuple[List[str], asyncio.Future]]:
+        """Retirar da fila requisições inteiras até `max_batch_size` textos (ao menos uma)"""
+        batch = []
+        count = 0
+        while self._queue:
+            texts, future = self._queue[0]
+            if batch and count + len(texts) > self.max_batch_size:
+                break
+            self._queue.popleft()
+            batch.append((texts, future))
+            count += len(texts)
+        self._queued_texts -= count
+        return batch
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queued_texts,
+        }
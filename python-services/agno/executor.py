@@ -0,0 +1,111 @@
+"""
+Camada de execução do Agno RAG: tira do event loop o trabalho pesado
+- threads: E/S de disco e pontuação (numpy libera o GIL durante o produto de matrizes)
+- processos: chunking, hashing e tokenização de documentos grandes
+- writer: uma única thread para gravações no SQLite, preservando a ordem das escritas
+Cada pool tem uma fila limitada: acima do limite, quem submete espera (backpressure).
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedPool:
+    """Executor com no máximo `queue_size` tarefas pendentes (em execução ou na fila)"""
+
+    def __init__(self, name: str, executor: Optional[Executor], queue_size: int):
+        self.name = name
+        self.executor = executor
+        self.queue_size = queue_size
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.submitted = 0
+        self.pending = 0
+
+    async def run(self, fn: Callable, *args) -> Any:
+        if self.executor is None:
+            # Pool desativado: executar na própria thread do loop
+            self.submitted += 1
+            return fn(*args)
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.queue_size)
+        async with self._slots:
+            self.submitted += 1
+            self.pending += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+            finally:
+                self.pending -= 1
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": getattr(self.executor, "_max_workers", 0) if self.executor is not None else 0,
+            "queue_size": self.queue_size,
+            "pending": self.pending,
+            "submitted": self.submitted,
+        }
+
+
+class ExecutionLayer:
+    """Pools de threads, processos e escrita configurados por variáveis de ambiente"""
+
+    def __init__(self, thread_workers: Optional[int] = None, process_workers: Optional[int] = None,
+                 queue_size: Optional[int] = None, offload_min_chars: Optional[int] = None):
+        cpu_count = os.cpu_count() or 1
+        if thread_workers is None:
+            thread_workers = int(os.getenv("MAX_WORKERS", "4"))
+        if process_workers is None:
+            process_workers = int(os.getenv("CPU_WORKERS", str(min(4, cpu_count))))
+        if queue_size is None:
+            queue_size = int(os.getenv("EXECUTOR_QUEUE_SIZE", "64"))
+        # Textos menores que isso são processados no loop (o custo de IPC supera o ganho)
+        if offload_min_chars is None:
+            offload_min_chars = int(os.getenv("CPU_OFFLOAD_MIN_CHARS", "20000"))
+        self.offload_min_chars = offload_min_chars
+
+        self.threads = BoundedPool(
+            "threads",
+            ThreadPoolExecutor(max_workers=thread_workers, thread_name_prefix="agno-io") if thread_workers > 0 else None,
+            queue_size
+        )
+        # "spawn": o processo principal tem threads (modelo, SQLite), fork não é seguro
+        self.processes = BoundedPool(
+            "processes",
+            ProcessPoolExecutor(max_workers=process_workers, mp_context=multiprocessing.get_context("spawn"))
+            if process_workers > 0 else None,
+            queue_size
+        )
+        self.writer = BoundedPool(
+            "writer",
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="agno-writer") if thread_workers > 0 else None,
+            queue_size
+        )
+
+    async def run_io(self, fn: Callable, *args) -> Any:
+        """E/S de disco e pontuação que libera o GIL"""
+        return await self.threads.run(fn, *args)
+
+    async def run_cpu(self, fn: Callable, *args) -> Any:
+        """Trabalho de CPU em Python puro (argumentos e retorno precisam ser serializáveis)"""
+        return await self.processes.run(fn, *args)
+
+    async def run_write(self, fn: Callable, *args) -> Any:
+        """Gravação no armazenamento, na ordem em que foi submetida"""
+        return await self.writer.run(fn, *args)
+
+    def shutdown(self):
+        for pool in (self.writer, self.threads, self.processes):
+            pool.shutdown()
+
+    def stats(self) -> Dict[str, Any]:
+        return {pool.name: pool.stats() for pool in (self.threads, self.processes, self.writer)}
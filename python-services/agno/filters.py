@@ -0,0 +1,241 @@
+"""
+Filtros estruturados de metadados do Agno RAG
+Índices secundários por campo (valor -> bitset de documentos) mantidos na ingestão,
+usados para restringir os candidatos antes de qualquer pontuação.
+
+Formato dos filtros (todas as condições precisam ser atendidas):
+    {"type": "chapter"}                          igualdade
+    {"project_id": {"in": [1, 2]}}               qualquer um dos valores
+    {"chapter_id": {"eq": 3}}                    igualdade explícita
+    {"added_at": {"gte": "2025-01-01"}}          intervalo (gt, gte, lt, lte) em datas ISO
+    {"document_id": {"in": ["a", "b"]}}          ids de documento
+"""
+
+import bisect
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+RANGE_OPERATORS = ("gt", "gte", "lt", "lte")
+RANGE_FIELDS = ("added_at",)
+SPECIAL_FIELDS = ("document_id", "added_at")
+
+
+def value_key(value: Any) -> Optional[Hashable]:
+    """Chave de um valor escalar (True, 1 e "1" são valores diferentes); None se não indexável"""
+    if isinstance(value, bool):
+        return ("b", value)
+    if isinstance(value, (int, float)):
+        return ("n", float(value))
+    if isinstance(value, str):
+        return ("s", value)
+    if value is None:
+        return ("z", None)
+    return None
+
+
+def validate_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """Verificar o formato dos filtros; levanta ValueError com a condição inválida"""
+    if not isinstance(filters, dict):
+        raise ValueError("Filtros devem ser um objeto {campo: condição}")
+
+    for field, condition in filters.items():
+        if not isinstance(condition, dict):
+            if value_key(condition) is None:
+                raise ValueError(f"Filtro '{field}': valor deve ser escalar")
+            continue
+        if not condition:
+            raise ValueError(f"Filtro '{field}': condição vazia")
+        for operator, operand in condition.items():
+            if operator == "eq":
+                if value_key(operand) is None:
+                    raise ValueError(f"Filtro '{field}': valor de 'eq' deve ser escalar")
+            elif operator == "in":
+                if not isinstance(operand, list) or any(value_key(item) is None for item in operand):
+                    raise ValueError(f"Filtro '{field}': 'in' espera uma lista de valores escalares")
+            elif operator in RANGE_OPERATORS:
+                if field not in RANGE_FIELDS:
+                    raise ValueError(f"Filtro '{field}': intervalos só são suportados em {', '.join(RANGE_FIELDS)}")
+                if not isinstance(operand, str):
+                    raise ValueError(f"Filtro '{field}': limite de '{operator}' deve ser uma data ISO")
+            else:
+                raise ValueError(f"Filtro '{field}': operador desconhecido '{operator}'")
+    return filters
+
+
+class Bitset:
+    """Conjunto de posições inteiras: um set enquanto é pequeno (valores raros, como títulos)
+    e um bytearray quando cresce (inserção e remoção O(1) nos dois casos)"""
+
+    __slots__ = ("_positions", "_bytes")
+
+    SPARSE_LIMIT = 64
+
+    def __init__(self):
+        self._positions: Optional[Set[int]] = set()
+        self._bytes: Optional[bytearray] = None
+
+    def add(self, position: int):
+        if self._bytes is None:
+            self._positions.add(position)
+            if len(self._positions) <= self.SPARSE_LIMIT:
+                return
+            positions, self._positions, self._bytes = self._positions, None, bytearray()
+            for item in positions:
+                self._set(item)
+        else:
+            self._set(position)
+
+    def _set(self, position: int):
+        byte = position >> 3
+        if byte >= len(self._bytes):
+            self._bytes.extend(bytes(byte + 1 - len(self._bytes)))
+        self._bytes[byte] |= 1 << (position & 7)
+
+    def discard(self, position: int):
+        if self._bytes is None:
+            self._positions.discard(position)
+            return
+        byte = position >> 3
+        if byte < len(self._bytes):
+            self._bytes[byte] &= ~(1 << (position & 7)) & 0xFF
+
+    def __bool__(self):
+        return bool(self._positions) if self._bytes is None else any(self._bytes)
+
+    def to_int(self) -> int:
+        """Bitset como inteiro (operações & e | em velocidade de C)"""
+        if self._bytes is None:
+            if not self._positions:
+                return 0
+            dense = bytearray((max(self._positions) >> 3) + 1)
+            for position in self._positions:
+                dense[position >> 3] |= 1 << (position & 7)
+            return int.from_bytes(dense, "little")
+        return int.from_bytes(self._bytes, "little")
+
+
+def iter_bits(bits: int):
+    """Posições dos bits ligados de um inteiro"""
+    # bin() invertido: a busca por '1' roda em C, o laço só visita os bits ligados
+    text = bin(bits)[:1:-1]
+    position = text.find("1")
+    while position >= 0:
+        yield position
+        position = text.find("1", position + 1)
+
+
+class MetadataIndex:
+    """Índices secundários de um índice do Agno: campo -> valor -> bitset de posições de documento"""
+
+    def __init__(self):
+        self.slots: Dict[str, int] = {}
+        self.document_ids: List[Optional[str]] = []
+        self.free_slots: List[int] = []
+        self.fields: Dict[str, Dict[Hashable, Bitset]] = {}
+        self.live = Bitset()
+        # (added_at, posição) ordenados, para filtros de intervalo
+        self.added_at: List[Tuple[str, int]] = []
+        # Entradas de cada posição (para remover sem a versão anterior do documento)
+        self._entries: Dict[int, Tuple[List[Tuple[str, Hashable]], str]] = {}
+
+    def __len__(self):
+        return len(self.slots)
+
+    def add(self, document_id: str, metadata: Dict[str, Any], added_at: str):
+        """Indexar (ou reindexar) os metadados de um documento"""
+        self.remove(document_id)
+        slot = self.free_slots.pop() if self.free_slots else len(self.document_ids)
+        if slot == len(self.document_ids):
+            self.document_ids.append(document_id)
+        else:
+            self.document_ids[slot] = document_id
+        self.slots[document_id] = slot
+        self.live.add(slot)
+
+        entries = []
+        # Campos especiais têm prioridade sobre chaves de metadados com o mesmo nome
+        fields = {field: value for field, value in (metadata or {}).items() if field not in SPECIAL_FIELDS}
+        fields["added_at"] = added_at
+        for field, value in fields.items():
+            # Listas indexam cada elemento (o filtro casa se algum elemento casar)
+            for item in value if isinstance(value, list) else (value,):
+                key = value_key(item)
+                if key is None:
+                    continue
+                self.fields.setdefault(field, {}).setdefault(key, Bitset()).add(slot)
+                entries.append((field, key))
+        bisect.insort(self.added_at, (added_at, slot))
+        self._entries[slot] = (entries, added_at)
+
+    def remove(self, document_id: str):
+        """Remover um documento dos índices"""
+        slot = self.slots.pop(document_id, None)
+        if slot is None:
+            return
+        entries, added_at = self._entries.pop(slot)
+        for field, key in entries:
+            values = self.fields[field]
+            bits = values.get(key)
+            if bits is None:
+                continue
+            bits.discard(slot)
+            if not bits:
+                del values[key]
+        del self.added_at[bisect.bisect_left(self.added_at, (added_at, slot))]
+        self.live.discard(slot)
+        self.document_ids[slot] = None
+        self.free_slots.append(slot)
+
+    def _values_bits(self, field: str, values: List[Any]) -> int:
+        """União dos bitsets de `values` no campo"""
+        if field == "document_id":
+            selected = Bitset()
+            for value in values:
+                slot = self.slots.get(value) if isinstance(value, str) else None
+                if slot is not None:
+                    selected.add(slot)
+            return selected.to_int()
+
+        bits = 0
+        index = self.fields.get(field, {})
+        for value in values:
+            bitset = index.get(value_key(value))
+            if bitset is not None:
+                bits |= bitset.to_int()
+        return bits
+
+    def _range_bits(self, operators: Dict[str, str]) -> int:
+        """Posições com added_at dentro dos limites"""
+        low, high = 0, len(self.added_at)
+        # Chaves de busca: ("data", -1) fica antes de qualquer posição; ("data", inf) depois
+        if "gte" in operators:
+            low = max(low, bisect.bisect_left(self.added_at, (operators["gte"], -1)))
+        if "gt" in operators:
+            low = max(low, bisect.bisect_left(self.added_at, (operators["gt"], float("inf"))))
+        if "lte" in operators:
+            high = min(high, bisect.bisect_left(self.added_at, (operators["lte"], float("inf"))))
+        if "lt" in operators:
+            high = min(high, bisect.bisect_left(self.added_at, (operators["lt"], -1)))
+
+        selected = Bitset()
+        for _, slot in self.added_at[low:high]:
+            selected.add(slot)
+        return selected.to_int()
+
+    def match(self, filters: Dict[str, Any]) -> Set[str]:
+        """Ids dos documentos que atendem a todas as condições"""
+        bits = self.live.to_int()
+        for field, condition in filters.items():
+            if not bits:
+                break
+            if not isinstance(condition, dict):
+                condition = {"eq": condition}
+            for operator, operand in condition.items():
+                if operator == "eq":
+                    bits &= self._values_bits(field, [operand])
+                elif operator == "in":
+                    bits &= self._values_bits(field, operand)
+            ranges = {operator: operand for operator, operand in condition.items() if operator in RANGE_OPERATORS}
+            if ranges:
+                bits &= self._range_bits(ranges)
+
+        return {self.document_ids[slot] for slot in iter_bits(bits)}
@@ -0,0 +1,192 @@
+"""
+Índice aproximado de vizinhos mais próximos (HNSW) para o Agno RAG
+Grafo hierárquico navegável sobre as linhas de um VectorStore (similaridade de cosseno)
+
+Os nós do grafo são posições de linha no VectorStore (append-only); os vetores
+não são copiados, apenas lidos via `get_vectors`.
+"""
+
+import heapq
+import math
+import pickle
+import random
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+GRAPH_FILE = "hnsw.pkl"
+
+
+class HNSWIndex:
+    """Grafo HNSW com inserção incremental e parâmetros `M` / `ef` ajustáveis"""
+
+    def __init__(self, get_vectors: Callable[[Sequence[int]], np.ndarray], M: int = 16,
+                 ef_construction: int = 100, ef_search: int = 64, seed: int = 42):
+        self.get_vectors = get_vectors
+        self.M = M
+        self.M0 = 2 * M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.level_mult = 1 / math.log(max(M, 2))
+        self.rng = random.Random(seed)
+
+        self.levels: List[int] = []
+        self.graph: List[Dict[int, List[int]]] = []
+        self.entry = -1
+        self.max_level = -1
+
+    def __len__(self):
+        return len(self.levels)
+
+    def params(self) -> Dict[str, int]:
+        return {"M": self.M, "ef_construction": self.ef_construction, "ef_search": self.ef_search}
+
+    def _similarities(self, query: np.ndarray, nodes: Sequence[int]) -> List[float]:
+        return (self.get_vectors(nodes) @ query).tolist()
+
+    def _search_layer(self, query: np.ndarray, entry_points: List[Tuple[float, int]], ef: int,
+                      layer: int, stats: Optional[Dict[str, int]] = None) -> List[Tuple[float, int]]:
+        """Busca gulosa em largura `ef` numa camada; retorna (similaridade, nó) em ordem decrescente.
+        Com `stats`, soma em stats["visited"] os nós pontuados."""
+        neighbors_of = self.graph[layer]
+        visited = {node for _, node in entry_points}
+        candidates = [(-sim, node) for sim, node in entry_points]
+        heapq.heapify(candidates)
+        results = list(entry_points)
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            negative_sim, node = heapq.heappop(candidates)
+            if len(results) >= ef and -negative_sim < results[0][0]:
+                break
+
+            fresh = [n for n in neighbors_of.get(node, ()) if n not in visited]
+            if not fresh:
+                continue
+            visited.update(fresh)
+
+            for neighbor, sim in zip(fresh, self._similarities(query, fresh)):
+                if len(results) < ef or sim > results[0][0]:
+                    heapq.heappush(candidates, (-sim, neighbor))
+                    heapq.heappush(results, (sim, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+
+        if stats is not None:
+            stats["visited"] = stats.get("visited", 0) + len(visited)
+        return sorted(results, reverse=True)
+
+    def _select_neighbors(self, candidates: List[Tuple[float, int]], m: int) -> List[int]:
+        """Heurística de seleção do HNSW: um candidato só entra se estiver mais perto da base
+        do que de qualquer vizinho já escolhido (mantém o grafo conectado entre clusters)"""
+        if len(candidates) <= 1:
+            return [node for _, node in candidates]
+
+        vectors = self.get_vectors([node for _, node in candidates])
+        selected: List[int] = []
+        selected_rows: List[int] = []
+        for row, (sim, node) in enumerate(candidates):
+            if len(selected) >= m:
+                break
+            if selected_rows and float(np.max(vectors[selected_rows] @ vectors[row])) >= sim:
+                continue
+            selected.append(node)
+            selected_rows.append(row)
+        return selected
+
+    def add(self, node: int, vector: np.ndarray):
+        """Inserir o nó `node` (próxima posição do VectorStore) com o vetor normalizado `vector`"""
+        if node != len(self.levels):
+            raise ValueError(f"Inserção fora de ordem no HNSW: esperado {len(self.levels)}, recebido {node}")
+
+        level = int(-math.log(1.0 - self.rng.random()) * self.level_mult)
+        self.levels.append(level)
+        while len(self.graph) <= level:
+            self.graph.append({})
+
+        if self.entry < 0:
+            for layer in range(level + 1):
+                self.graph[layer][node] = []
+            self.entry, self.max_level = node, level
+            return
+
+        entry_points = [(self._similarities(vector, [self.entry])[0], self.entry)]
+        for layer in range(self.max_level, level, -1):
+            entry_points = self._search_layer(vector, entry_points, 1, layer)
+
+        for layer in range(min(level, self.max_level), -1, -1):
+            candidates = self._search_layer(vector, entry_points, self.ef_construction, layer)
+            max_neighbors = self.M0 if layer == 0 else self.M
+            neighbors = self._select_neighbors(candidates, self.M)
+            self.graph[layer][node] = neighbors
+
+            for neighbor in neighbors:
+                links = self.graph[layer][neighbor]
+                links.append(node)
+                if len(links) > max_neighbors:
+                    base = self.get_vectors([neighbor])[0]
+                    ranked = sorted(zip(self._similarities(base, links), links), reverse=True)
+                    self.graph[layer][neighbor] = self._select_neighbors(ranked, max_neighbors)
+
+            entry_points = candidates
+
+        for layer in range(self.max_level + 1, level + 1):
+            self.graph[layer][node] = []
+        if level > self.max_level:
+            self.entry, self.max_level = node, level
+
+    def search(self, query: np.ndarray, k: int, ef: Optional[int] = None,
+               stats: Optional[Dict[str, int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Retornar (posições, similaridades) aproximadas dos `k` vizinhos mais próximos.
+        `stats` (opcional) recebe "visited": nós pontuados em todas as camadas."""
+        if self.entry < 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        ef = max(ef or self.ef_search, k)
+        entry_points = [(self._similarities(query, [self.entry])[0], self.entry)]
+        for layer in range(self.max_level, 0, -1):
+            entry_points = self._search_layer(query, entry_points, 1, layer, stats)
+        found = self._search_layer(query, entry_points, ef, 0, stats)[:k]
+
+        positions = np.array([node for _, node in found], dtype=np.int64)
+        sims = np.array([sim for sim, _ in found], dtype=np.float32)
+        return positions, sims
+
+    def save(self, directory: Path):
+        """Gravar o grafo no diretório do índice"""
+        path = Path(directory) / GRAPH_FILE
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({
+                "params": self.params(),
+                "levels": self.levels,
+                "graph": self.graph,
+                "entry": self.entry,
+                "max_level": self.max_level,
+                "rng": self.rng.getstate(),
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, directory: Path, get_vectors: Callable[[Sequence[int]], np.ndarray], M: int = 16,
+             ef_construction: int = 100, ef_search: int = 64) -> "HNSWIndex":
+        """Carregar o grafo salvo (se existir com os mesmos parâmetros) ou criar um vazio"""
+        index = cls(get_vectors, M=M, ef_construction=ef_construction, ef_search=ef_search)
+        path = Path(directory) / GRAPH_FILE
+        if not path.exists():
+            return index
+
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state["params"]["M"] != M or state["params"]["ef_construction"] != ef_construction:
+            return index
+
+        index.levels = state["levels"]
+        index.graph = state["graph"]
+        index.entry = state["entry"]
+        index.max_level = state["max_level"]
+        index.rng.setstate(state["rng"])
+        return index
@@ -0,0 +1,172 @@
+"""
+Índice invertido com pontuação BM25 para o Agno RAG
+Usado no modo "basic-text-search" (sem modelo de embeddings)
+"""
+
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Collection, Dict, List, Optional, Tuple
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Quebrar texto em termos minúsculos"""
+    return TOKEN_RE.findall(text.lower())
+
+
+class InvertedIndex:
+    """Listas de postings (chunk -> frequência do termo) com comprimento de cada chunk"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.lengths: Dict[int, int] = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def add(self, chunk_id: int, text: str, terms: Optional[Dict[str, int]] = None):
+        """Indexar um chunk (`terms`: frequências já calculadas, ex.: num processo separado)"""
+        if terms is None:
+            terms = Counter(tokenize(text))
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[chunk_id] = tf
+
+        length = sum(terms.values())
+        self.lengths[chunk_id] = length
+        self.total_length += length
+
+    def remove(self, chunk_id: int, text: str):
+        """Remover um chunk indexado com o mesmo `text`"""
+        if chunk_id not in self.lengths:
+            return
+
+        for term in set(tokenize(text)):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(chunk_id, None)
+            if not postings:
+                del self.postings[term]
+
+        self.total_length -= self.lengths.pop(chunk_id)
+
+    def search(self, query: str, k: int, candidates: Optional[Collection[int]] = None,
+               collection: Optional[Tuple[int, int, Dict[str, int]]] = None) -> List[Tuple[int, float]]:
+        """Retornar os `k` chunks com maior score BM25 como (chunk_id, score).
+        Com `candidates`, só esses chunks são pontuados (filtro aplicado antes do BM25).
+        `collection` = (chunks, tamanho total, df dos termos) substitui as estatísticas locais
+        (índice particionado: todas as partições pontuam como um único índice)."""
+        if collection is None:
+            count, total_length, frequencies = len(self.lengths), self.total_length, None
+        else:
+            count, total_length, frequencies = collection
+        if not self.lengths or count == 0 or k <= 0:
+            return []
+
+        avg_length = total_length / count or 1.0
+        lengths = self.lengths
+        scores: Dict[int, float] = {}
+
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+
+            df = len(postings) if frequencies is None else frequencies.get(term, len(postings))
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            if candidates is None:
+                # Cópia das postings: a busca pode rodar numa thread enquanto o índice recebe escritas
+                matches = list(postings.items())
+            elif len(candidates) < df:
+                matches = [(chunk_id, postings.get(chunk_id)) for chunk_id in candidates]
+            else:
+                matches = [(chunk_id, tf) for chunk_id, tf in list(postings.items()) if chunk_id in candidates]
+            for chunk_id, tf in matches:
+                length = lengths.get(chunk_id)
+                if length is None or not tf:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def for_query(self, query: str) -> Tuple[int, int, Dict[str, int]]:
+        """Estatísticas locais no formato de `CollectionStats.for_query`"""
+        return len(self.lengths), self.total_length, \
+            {term: len(self.postings.get(term, ())) for term in set(tokenize(query))}
+
+    def matching(self, query: str, candidates: Optional[Collection[int]] = None) -> int:
+        """Quantos chunks contêm algum termo da consulta (os que o BM25 pontua)"""
+        matched = set()
+        for term in set(tokenize(query)):
+            matched.update(self.postings.get(term, ()))
+        if candidates is not None:
+            matched.intersection_update(candidates)
+        return len(matched)
+
+    def vocabulary_size(self) -> int:
+        return len(self.postings)
+
+    def postings_count(self) -> int:
+        return sum(len(postings) for postings in self.postings.values())
+
+
+class CollectionStats:
+    """Estatísticas do BM25 de um índice particionado (chunks por termo e tamanhos), sem postings"""
+
+    def __init__(self):
+        self.frequencies: Dict[str, int] = {}
+        self.count = 0
+        self.total_length = 0
+
+    def add(self, terms: Dict[str, int]):
+        for term in terms:
+            self.frequencies[term] = self.frequencies.get(term, 0) + 1
+        self.count += 1
+        self.total_length += sum(terms.values())
+
+    def remove(self, text: str):
+        tokens = tokenize(text)
+        for term in set(tokens):
+            df = self.frequencies.get(term, 0) - 1
+            if df > 0:
+                self.frequencies[term] = df
+            else:
+                self.frequencies.pop(term, None)
+        self.count -= 1
+        self.total_length -= len(tokens)
+
+    def for_query(self, query: str) -> Tuple[int, int, Dict[str, int]]:
+        """Argumento `collection` de InvertedIndex.search para esta consulta"""
+        return self.count, self.total_length, {term: self.frequencies.get(term, 0) for term in set(tokenize(query))}
+
+    def vocabulary_size(self) -> int:
+        return len(self.frequencies)
+
+
+def explain_bm25(query: str, text: str, collection: Tuple[int, int, Dict[str, int]],
+                 k1: float = 1.5, b: float = 0.75) -> Dict[str, float]:
+    """Contribuição de cada termo da consulta ao score BM25 de um chunk (a soma é o score de
+    `InvertedIndex.search` com as mesmas estatísticas); termos ausentes do chunk ficam de fora"""
+    count, total_length, frequencies = collection
+    tokens = tokenize(text)
+    if not tokens or count == 0:
+        return {}
+    avg_length = total_length / count or 1.0
+    norm = k1 * (1 - b + b * len(tokens) / avg_length)
+    counts = Counter(tokens)
+    contributions = {}
+    for term in set(tokenize(query)):
+        tf = counts.get(term)
+        df = frequencies.get(term, 0)
+        if not tf or not df:
+            continue
+        idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+        contributions[term] = idf * tf * (k1 + 1) / (tf + norm)
+    return dict(sorted(contributions.items(), key=lambda item: -item[1]))
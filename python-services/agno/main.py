@@ -5,23 +5,128 @@ Compatível com o Gerador de E-books e Cursos
 """
 
 import os
+import re
 import sys
+import json
 import asyncio
+import base64
+import hashlib
+import heapq
+import itertools
 import logging
+import shutil
+import time
+from array import array
+from collections import Counter
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Literal, Optional, Set, Tuple
 from datetime import datetime
 
 import uvicorn
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, field_validator
+
+from chunking import DEFAULT_CHUNK_OVERLAP, DEFAULT_CHUNK_SIZE, analyze_text, iter_chunk_spans, validate_chunk_settings
+from documents import ChunkTable, StoredDocument, chunk_hash
+from executor import ExecutionLayer
+from filters import MetadataIndex, validate_filters
+from lexical_index import CollectionStats, InvertedIndex, explain_bm25, tokenize
+from metrics import CONTENT_TYPE, Family, Registry, monitor_loop_lag
+from shards import SEED_BATCH_ROWS, ShardPool, ShardUpdates, merge_hits, shard_of
+from storage import DocumentStore
+from wal import WriteAheadLog
+from caching import EmbeddingCache, LRUCache
+
+try:
+    import numpy as np
+    from vector_store import VectorStore
+    from embedding_scheduler import EmbeddingBatcher
+    from hnsw import HNSWIndex
+except ImportError:
+    # numpy não instalado (requirements-minimal) - apenas busca básica
+    np = None
+    VectorStore = None
+    EmbeddingBatcher = None
+    HNSWIndex = None
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Documentos por transação no endpoint /documents/batch
+BATCH_COMMIT_SIZE = int(os.getenv("AGNO_BATCH_COMMIT_SIZE", "64"))
+
+# Reciprocal rank fusion (busca híbrida): constante de suavização e pesos padrão de cada ranking
+RRF_K = 60
+DEFAULT_FUSION_WEIGHTS = {"lexical": 1.0, "vector": 1.0}
+
+# Texto do encode de aquecimento (EMBEDDING_WARMUP), repetido até o tamanho de um lote
+WARMUP_TEXT = "Aquecimento do modelo de embeddings: um lote descartável antes da primeira requisição."
+
+# Métricas expostas em /metrics (formato texto do Prometheus)
+METRICS = Registry()
+SEARCH_SECONDS = METRICS.histogram(
+    "agno_search_duration_seconds", "Duração das buscas, incluindo acertos de cache", ("index", "mode"))
+SEARCH_STAGE_SECONDS = METRICS.histogram(
+    "agno_search_stage_duration_seconds", "Duração de cada etapa da busca (embed, vector, lexical, ...)", ("stage",))
+INGEST_SECONDS = METRICS.histogram(
+    "agno_ingest_duration_seconds", "Duração da indexação de um lote de documentos", ("index",))
+CHUNKING_SECONDS = METRICS.histogram(
+    "agno_chunking_duration_seconds", "Chunking, hashes e termos de um documento")
+EMBEDDING_SECONDS = METRICS.histogram(
+    "agno_embedding_duration_seconds", "Chamada ao modelo de embeddings (um lote)")
+PERSISTENCE_SECONDS = METRICS.histogram(
+    "agno_persistence_duration_seconds", "Gravações: commit no log, aplicação ao SQLite e compactação de vetores",
+    ("operation",))
+LOOP_LAG_SECONDS = METRICS.histogram("agno_event_loop_lag_seconds", "Atraso do event loop")
+LOOP_LAG = METRICS.gauge("agno_event_loop_lag_last_seconds", "Último atraso medido do event loop")
+DOCUMENTS_INGESTED = METRICS.counter(
+    "agno_documents_ingested_total", "Documentos adicionados ou atualizados", ("index",))
+DOCUMENTS_DELETED = METRICS.counter("agno_documents_deleted_total", "Documentos removidos", ("index",))
+CHUNKS_INDEXED = METRICS.counter(
+    "agno_chunks_indexed_total", "Chunks novos indexados (os reaproveitados por hash não contam)", ("index",))
+TEXTS_EMBEDDED = METRICS.counter("agno_texts_embedded_total", "Textos enviados ao modelo de embeddings")
+
+
+def glob_escape(name: str) -> str:
+    """Escapar caracteres especiais de glob em nomes de índice"""
+    return re.sub(r"([\[\]*?])", r"[\1]", name)
+
+
+def elapsed_ms(started: float) -> float:
+    """Milissegundos desde `started` (time.perf_counter)"""
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """Valor do cabeçalho Server-Timing (`etapa;dur=ms`, na ordem em que as etapas foram medidas)"""
+    return ", ".join(f"{stage};dur={duration}" for stage, duration in timings.items())
+
+
+def load_encoder(model_name: str, device: str):
+    """Importar sentence-transformers (e torch) e carregar o modelo; roda numa thread do executor"""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name, device=device)
+
+def directory_bytes(path: Path) -> int:
+    """Tamanho em disco dos arquivos de um diretório (recursivo); 0 se não existir"""
+    total = 0
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                total += directory_bytes(Path(entry.path))
+            else:
+                total += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            continue
+    return total
+
 # Modelos Pydantic
 class DocumentRequest(BaseModel):
     index: str
@@ -34,58 +139,393 @@ class SearchRequest(BaseModel):
     query: str
     limit: int = 5
     include_metadata: bool = True
+    mode: Optional[Literal["lexical", "vector", "hybrid"]] = None
+    weights: Optional[Dict[str, float]] = None
+    rrf_k: int = Field(RRF_K, gt=0)
+    filters: Optional[Dict[str, Any]] = None
+    cursor: Optional[str] = None
+    stream: bool = False
+    explain: bool = False
+    
+    @field_validator("filters")
+    @classmethod
+    def check_filters(cls, filters):
+        return validate_filters(filters) if filters is not None else None
 
 class IndexRequest(BaseModel):
     name: str
     description: str = ""
     settings: Dict[str, Any] = {}
 
+class SearchBatchRequest(BaseModel):
+    searches: List[SearchRequest] = Field(..., min_length=1)
+
 class HealthResponse(BaseModel):
     status: str
     version: str
     timestamp: str
     services: Dict[str, str]
 
+class SearchPlan:
+    """Parâmetros resolvidos de uma busca (etapas compartilhadas por /search e /search/batch)"""
+    
+    __slots__ = ("index", "query", "limit", "include_metadata", "mode", "weights", "rrf_k", "filters",
+                 "generation", "offset", "depth", "k", "matched", "candidates", "query_vector", "previous",
+                 "exhausted", "next_cursor", "ranking_key", "cache_key", "started", "timings",
+                 "explain", "examined", "components", "explanations")
+
+class InvalidCursor(ValueError):
+    """Cursor de paginação malformado ou de outra busca (erro do cliente)"""
+
+class ExpiredCursor(InvalidCursor):
+    """Cursor de uma geração anterior do índice: a busca precisa recomeçar da primeira página"""
+
 # Simulação do Agno RAG (implementação básica)
 class AgnoRAG:
     def __init__(self):
         self.indices = {}
         self.documents = {}
         self.embeddings_model = None
+        self.model_name = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        self.encoder = None
+        # Modelo de embeddings, carregado em segundo plano (_load_model):
+        # pending → loading → indexing → ready, ou unavailable/failed (modo básico)
+        self.model_state = "pending"
+        # Índices cujos chunks já têm vetores; nos demais a ingestão deixa os vetores para o backfill
+        self.vectors_ready = set()
+        self.indices_loaded = False
+        self._startup = None
+        self._model_loader = None
+        self.batcher = None
+        self.embedding_cache = None
+        self.batch_size = 64
+        self.vector_stores = {}
+        self.ann_indices = {}
+        self.lexical_indices = {}
+        self.metadata_indices = {}
+        self.ingest_locks = {}
+        self.chunk_refs = {}
+        # Shards de busca (SEARCH_SHARDS > 0): postings e vetores ficam nos processos de shard
+        self.shards = None
+        self.shard_updates = {}
+        self.collection_stats = {}
+        # Linhas de vetores de chunks removidos ou substituídos (tombstones), por índice
+        self.tombstones = {}
+        self._background = set()
+        self._vector_compactor = None
+        self._loop_monitor = None
+        # Geração de cada índice: muda a cada escrita e invalida o cache de buscas
+        self.generations = {}
+        self._generation_counter = itertools.count(1)
+        cache_enabled = os.getenv("ENABLE_CACHE", "true").lower() != "false"
+        self.search_cache = LRUCache(int(os.getenv("SEARCH_CACHE_SIZE", "1024")) if cache_enabled else 0)
+        self.search_cache_stats = {}
+        # Rankings por documento das buscas recentes: as páginas seguintes (cursor) saem daqui.
+        # Independe de ENABLE_CACHE: é o que mantém as páginas estáveis (HNSW e RRF mudam com k)
+        self.rankings = LRUCache(int(os.getenv("SEARCH_CURSOR_CACHE_SIZE", "256")))
+        self.executor = ExecutionLayer()
         self.data_dir = Path("./data/agno")
         self.data_dir.mkdir(parents=True, exist_ok=True)
+        # Diretórios descartados (índices removidos, vetores compactados) esperando a remoção em segundo plano
+        self.trash_dir = self.data_dir / "trash"
+        self.store = DocumentStore(self.data_dir / "agno.db")
+        # Mutações vão primeiro para o log (commit em grupo); o compactador as aplica ao SQLite
+        self.wal = WriteAheadLog(
+            self.data_dir / "wal",
+            flush_interval_ms=float(os.getenv("WAL_FLUSH_MS", "10")),
+            max_batch=int(os.getenv("WAL_MAX_BATCH", "256")),
+            compact_bytes=int(os.getenv("WAL_COMPACT_BYTES", str(64 * 1024 * 1024)))
+        )
         
+    def start(self):
+        """Rodar `initialize` em segundo plano: o servidor aceita conexões (e responde /health/live)
+        enquanto o log é recuperado e os índices são recarregados"""
+        self._startup = asyncio.get_running_loop().create_task(self.initialize())
+        self._startup.add_done_callback(self._startup_done)
+    
+    def _startup_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Erro ao inicializar Agno RAG: {task.exception()}")
+    
+    async def wait_loaded(self):
+        """Esperar a inicialização iniciada por `start` (shield: uma requisição cancelada não a interrompe)"""
+        if self._startup is not None:
+            await asyncio.shield(self._startup)
+    
+    async def wait_model(self):
+        """Esperar o carregamento do modelo de embeddings e o cálculo dos vetores pendentes"""
+        await self.wait_loaded()
+        if self._model_loader is not None:
+            await asyncio.shield(self._model_loader)
+    
+    def readiness(self) -> Dict[str, Any]:
+        """Estado da inicialização: índices (busca lexical) e modelo de embeddings (busca vetorial)"""
+        if self.indices_loaded:
+            indices = "loaded"
+        elif self._startup is not None and self._startup.done():
+            indices = "failed"
+        else:
+            indices = "loading"
+        return {
+            "indices": indices,
+            "model": self.model_state,
+            "search_modes": ["lexical", "vector", "hybrid"] if self.model_state == "ready" else ["lexical"]
+        }
+    
     async def initialize(self):
-        """Inicializar o sistema RAG"""
+        """Inicializar o sistema RAG: recuperar o log e recarregar os índices. Ao retornar, a busca
+        lexical já funciona; o modelo de embeddings carrega em segundo plano (ver `wait_model`)"""
+        logger.info("Inicializando sistema RAG...")
+        
+        shard_count = int(os.getenv("SEARCH_SHARDS", "0"))
+        if shard_count > 0:
+            self.shards = ShardPool(shard_count)
+        
+        # Recuperação: aplicar ao SQLite o que ficou no log antes de recarregar
+        await self.wal.compact(self._apply_wal)
+        self._purge_leftovers()
+        self._import_legacy_json()
+        await self._load_from_store()
+        self.wal.start_compactor(self._apply_wal, float(os.getenv("WAL_COMPACT_INTERVAL_S", "30")))
+        self._vector_compactor = asyncio.get_running_loop().create_task(self._run_vector_compactor(
+            float(os.getenv("VECTOR_COMPACT_INTERVAL_S", "60")),
+            float(os.getenv("VECTOR_COMPACT_RATIO", "0.2"))
+        ))
+        self._loop_monitor = asyncio.get_running_loop().create_task(monitor_loop_lag(LOOP_LAG_SECONDS, LOOP_LAG))
+        METRICS.register_collector(self._collect_metrics)
+        self.indices_loaded = True
+        self._model_loader = asyncio.get_running_loop().create_task(self._load_model())
+        logger.info("Agno RAG inicializado (modelo de embeddings carregando em segundo plano)")
+    
+    async def _load_model(self):
+        """Carregar o modelo de embeddings fora do event loop (importar torch leva segundos), aquecê-lo
+        e calcular os vetores pendentes. Até terminar, as buscas usam o modo lexical."""
+        started = time.perf_counter()
+        self.model_state = "loading"
         try:
-            # Tentar carregar modelo de embeddings
-            logger.info("Inicializando sistema RAG...")
-            
-            try:
-                # Tentar importar sentence-transformers
-                from sentence_transformers import SentenceTransformer
-                self.embeddings_model = "sentence-transformers/all-MiniLM-L6-v2"
-                logger.info("Modelo de embeddings carregado")
-            except ImportError:
-                logger.warning("sentence-transformers não disponível - usando modo básico")
-                self.embeddings_model = "basic-text-search"
-            
-            logger.info("Agno RAG inicializado com sucesso!")
+            if VectorStore is None:
+                raise ImportError("numpy não disponível")
+            encoder = await self.executor.run_io(load_encoder, self.model_name, os.getenv("EMBEDDING_DEVICE", "cpu"))
+            batch_size = int(os.getenv("BATCH_SIZE", "64"))
+            if os.getenv("EMBEDDING_WARMUP", "true").lower() != "false":
+                # Primeiro encode paga a inicialização dos kernels e das alocações: melhor aqui que numa requisição
+                await self.executor.run_io(lambda: encoder.encode(
+                    [WARMUP_TEXT] * batch_size, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False
+                ))
+        except ImportError:
+            logger.warning("sentence-transformers não disponível - usando modo básico")
+            self.embeddings_model = "basic-text-search"
+            self.model_state = "unavailable"
+            return
         except Exception as e:
-            logger.error(f"Erro ao inicializar Agno RAG: {e}")
-            # Não falhar completamente, continuar em modo básico
+            logger.error(f"Erro ao carregar o modelo de embeddings: {e}")
             self.embeddings_model = "basic-text-search"
-            logger.info("Agno RAG inicializado em modo básico")
+            self.model_state = "failed"
+            logger.info("Agno RAG seguindo em modo básico")
+            return
+        
+        self.encoder = encoder
+        self.embeddings_model = self.model_name
+        self.batch_size = batch_size
+        self.batcher = EmbeddingBatcher(
+            self._encode,
+            max_batch_size=self.batch_size,
+            max_wait_ms=float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+        )
+        self.embedding_cache = EmbeddingCache(
+            self.data_dir / "embedding_cache.db",
+            memory_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+        )
+        logger.info(f"Modelo de embeddings carregado: {self.model_name} em {time.perf_counter() - started:.2f}s")
+        
+        # Índices criados durante o backfill entram na rodada seguinte
+        self.model_state = "indexing"
+        try:
+            while True:
+                pending = [name for name in self.indices if name not in self.vectors_ready]
+                if not pending:
+                    break
+                for name in pending:
+                    await self._backfill_vectors(name)
+        except Exception as e:
+            logger.error(f"Erro ao calcular os vetores pendentes: {e}")
+            self.model_state = "failed"
+            return
+        # Sem await entre a última verificação e a troca: create_index vê "ready" ou entra no backfill
+        self.model_state = "ready"
+        logger.info(f"Busca vetorial disponível em {time.perf_counter() - started:.2f}s")
+    
+    async def _backfill_vectors(self, index: str):
+        """Embutir os chunks do índice que ainda não têm vetor (indexados em modo básico ou enquanto
+        o modelo carregava); depois disso a ingestão calcula os vetores dos próprios documentos"""
+        lock = self.ingest_locks.get(index)
+        if lock is None:
+            return
+        async with lock:
+            if self.ingest_locks.get(index) is not lock:
+                # Índice removido enquanto esperava o lock
+                return
+            store = self.vector_stores.get(index)
+            stored_ids = set(store.ids().tolist()) if store is not None else set()
+            missing = []
+            for document in self.documents[index].values():
+                ordinals = [ordinal for ordinal, chunk_id in enumerate(document.chunk_ids) if chunk_id not in stored_ids]
+                if ordinals:
+                    missing.append((document, ordinals))
+            if missing:
+                # O lock já é nosso: calcular e gravar direto (sem _index_vectors, que o adquire)
+                vectors = await self._embed([document.chunk(ordinal) for document, ordinals in missing for ordinal in ordinals])
+                if self.ingest_locks.get(index) is not lock:
+                    # Índice removido ou recriado enquanto os embeddings eram calculados
+                    return
+                await self._store_vectors(index, missing, vectors)
+            self.vectors_ready.add(index)
+        await self._flush_shards(index)
+        if missing:
+            logger.info(f"{sum(len(ordinals) for _, ordinals in missing)} chunks do índice '{index}' embutidos")
+    
+    async def _apply_wal(self, records: List[Dict[str, Any]]):
+        """Aplicar registros do log ao SQLite (uma transação por segmento, na thread de escrita)"""
+        with PERSISTENCE_SECONDS.time(operation="sqlite_apply"):
+            await self.executor.run_write(self.store.apply_records, records)
+    
+    async def _log(self, record: Dict[str, Any]):
+        """Acrescentar uma mutação ao log de escrita (retorna depois do fsync do grupo)"""
+        with PERSISTENCE_SECONDS.time(operation="wal_commit"):
+            await self.wal.append(record)
+    
+    async def _load_from_store(self):
+        """Recarregar índices e documentos persistidos no SQLite"""
+        started = time.perf_counter()
+        documents = 0
+        for index_data in self.store.load_indices():
+            name = index_data["name"]
+            self._reset_index_state(index_data)
+            if self.shards is not None:
+                await self.shards.broadcast("create", name, index_data.get("settings") or {})
+            
+            # Embeddings persistidos são mapeados do disco, sem re-calcular (nem esperar o modelo)
+            store = None
+            if VectorStore is not None:
+                store = VectorStore.open(self._vectors_dir(name), model=self.model_name)
+                self.vector_stores[name] = store
+            stored_ids = set(store.ids().tolist()) if store is not None else set()
+            refs = self.chunk_refs[name]
+            # Ids com vetores gravados (mesmo obsoletos) nunca são realocados
+            refs.reserve(max(stored_ids) + 1 if stored_ids else 0)
+            
+            for document in self.store.load_documents(name):
+                if any(refs.get(chunk_id) is not None for chunk_id in document.chunk_ids):
+                    # Registro sem ids de chunk próprios (esquema antigo): alocar novos
+                    del document.chunk_ids[:]
+                    document.chunk_ids.extend(refs.allocate(len(document)))
+                self._index_document(name, document, reuse=False)
+                documents += 1
+                if documents % 256 == 0:
+                    # Ceder o loop: /health/live e /metrics respondem durante a recarga
+                    await asyncio.sleep(0)
+            index_data["document_count"] = len(self.documents[name])
+            if store is not None:
+                self.tombstones[name] = len(store) - sum(1 for chunk_id in stored_ids if refs.get(chunk_id) is not None)
+            if self.shards is not None and store is not None:
+                await self._seed_shard_vectors(name, store)
+            # Documentos sem vetores (ex.: indexados em modo básico) são embutidos quando o modelo carregar
+            await self._flush_shards(name)
+            
+            if store is not None and self._ann_settings(name) is not None:
+                await self._attach_ann(name, store)
+                await self.executor.run_io(self.ann_indices[name].save, store.directory)
+        
+        if self.indices:
+            elapsed = time.perf_counter() - started
+            logger.info(f"{len(self.indices)} índices e {documents} documentos recarregados em {elapsed:.2f}s")
+    
+    def _import_legacy_json(self):
+        """Migrar arquivos JSON do formato antigo ({index}_index.json, {index}_{id}.json) para o SQLite"""
+        for index_file in sorted(self.data_dir.glob("*_index.json")):
+            try:
+                with open(index_file, 'r', encoding='utf-8') as f:
+                    index_data = json.load(f)
+                name = index_data["name"]
+                
+                imported = []
+                for doc_file in self.data_dir.glob(f"{glob_escape(name)}_*.json"):
+                    if doc_file == index_file:
+                        continue
+                    with open(doc_file, 'r', encoding='utf-8') as f:
+                        document_data = json.load(f)
+                    # O nome do arquivo precisa corresponder exatamente (evita prefixos de outros índices)
+                    if not isinstance(document_data, dict) or doc_file.name != f"{name}_{document_data.get('id')}.json":
+                        continue
+                    imported.append((doc_file, document_data))
+                
+                index_data["document_count"] = len(imported)
+                self.store.save_index(index_data)
+                first_id = 0
+                for count, (doc_file, document_data) in enumerate(imported, start=1):
+                    document = StoredDocument(
+                        document_data["id"],
+                        document_data["content"],
+                        document_data.get("metadata"),
+                        document_data["added_at"],
+                        document_data.get("embedding_model"),
+                        self._chunk_spans(index_data.get("settings") or {}, document_data["content"])
+                    )
+                    document.chunk_ids.extend(range(first_id, first_id + len(document)))
+                    self.store.save_document(name, document, count)
+                    first_id += len(document)
+                
+                for doc_file, _ in imported:
+                    doc_file.unlink()
+                index_file.unlink()
+                logger.info(f"Índice '{name}' migrado de JSON para SQLite ({len(imported)} documentos)")
+            except Exception as e:
+                logger.error(f"Erro ao migrar {index_file.name}: {e}")
+    
+    def _reset_index_state(self, index_data: Dict):
+        """Criar as estruturas em memória de um índice vazio"""
+        name = index_data["name"]
+        self.indices[name] = index_data
+        self.documents[name] = {}
+        self.vector_stores[name] = None
+        self.ann_indices.pop(name, None)
+        self.lexical_indices[name] = InvertedIndex()
+        self.metadata_indices[name] = MetadataIndex()
+        # Lock novo a cada (re)criação: quem ainda segura o do índice anterior percebe a troca e não grava
+        self.ingest_locks[name] = asyncio.Lock()
+        self.chunk_refs[name] = ChunkTable()
+        if self.shards is not None:
+            self.shard_updates[name] = ShardUpdates(self.shards.count)
+            self.collection_stats[name] = CollectionStats()
+        self.search_cache_stats[name] = {"hits": 0, "misses": 0}
+        self.tombstones[name] = 0
+        # Com o modelo pronto, índices novos já calculam vetores na ingestão; senão esperam o backfill
+        if self.model_state == "ready":
+            self.vectors_ready.add(name)
+        else:
+            self.vectors_ready.discard(name)
+        self._bump_generation(name)
+    
+    def _bump_generation(self, index: str):
+        """Avançar a geração do índice (entradas antigas do cache deixam de ser alcançáveis)"""
+        self.generations[index] = next(self._generation_counter)
     
     async def create_index(self, name: str, description: str = "", settings: Dict = None):
         """Criar um novo índice"""
         if settings is None:
             settings = {
                 "embedding_model": "sentence-transformers/all-MiniLM-L6-v2",
-                "chunk_size": 1000,
-                "chunk_overlap": 200
+                "chunk_size": DEFAULT_CHUNK_SIZE,
+                "chunk_overlap": DEFAULT_CHUNK_OVERLAP
             }
         
+        if settings.get("quantization") not in (None, "float16", "int8"):
+            raise ValueError(f"Quantização inválida: {settings['quantization']} (use float16 ou int8)")
+        validate_chunk_settings(
+            int(settings.get("chunk_size", DEFAULT_CHUNK_SIZE)),
+            int(settings.get("chunk_overlap", DEFAULT_CHUNK_OVERLAP))
+        )
+        
         index_data = {
             "name": name,
             "description": description,
@@ -94,100 +534,1075 @@ class AgnoRAG:
             "document_count": 0
         }
         
-        self.indices[name] = index_data
-        self.documents[name] = {}
+        previous = self.vector_stores.get(name)
+        if previous is not None:
+            self._discard_directory(previous.directory)
+        self._reset_index_state(index_data)
+        if self.shards is not None:
+            await self.shards.broadcast("create", name, settings)
         
-        # Salvar índice
-        index_file = self.data_dir / f"{name}_index.json"
-        import json
-        with open(index_file, 'w', encoding='utf-8') as f:
-            json.dump(index_data, f, indent=2, ensure_ascii=False)
+        # Salvar índice (cópia: document_count muda em memória antes da gravação)
+        await self._log({"op": "create_index", "index": dict(index_data)})
         
         logger.info(f"Índice '{name}' criado com sucesso")
         return index_data
     
-    async def add_document(self, index: str, document_id: str, content: str, metadata: Dict = None):
+    async def add_document(self, index: str, document_id: str, content: str, metadata: Dict = None,
+                           timings: Optional[Dict[str, float]] = None):
         """Adicionar documento ao índice"""
+        documents = await self.add_documents(index, [{
+            "document_id": document_id,
+            "content": content,
+            "metadata": metadata
+        }], timings=timings)
+        
+        logger.info(f"Documento '{document_id}' adicionado ao índice '{index}'")
+        return documents[0].to_dict()
+    
+    async def add_documents(self, index: str, documents: List[Dict], timings: Optional[Dict[str, float]] = None):
+        """Adicionar vários documentos ao índice (embeddings em lote, uma única transação).
+        Se `timings` for um dicionário, recebe a duração de cada etapa em milissegundos.
+        Retorna os documentos armazenados (StoredDocument; `to_dict` dá o formato da API)."""
         if index not in self.indices:
             raise ValueError(f"Índice '{index}' não encontrado")
         
-        if metadata is None:
-            metadata = {}
+        timings = {} if timings is None else timings
+        started = time.perf_counter()
+        added_at = datetime.now().isoformat()
+        items = []
+        pending_vectors = []
+        
+        # O lock mantém a ordem de chegada entre requisições concorrentes ao mesmo índice
+        lock = self.ingest_locks[index]
+        async with lock:
+            stage_started = time.perf_counter()
+            analyses = await self._analyze_documents(index, [request["content"] for request in documents])
+            timings["chunking"] = elapsed_ms(stage_started)
+            stage_started = time.perf_counter()
+            for request, (spans, hashes, terms) in zip(documents, analyses):
+                document = StoredDocument(
+                    request["document_id"],
+                    request["content"],
+                    request.get("metadata"),
+                    added_at,
+                    self.embeddings_model,
+                    spans
+                )
+                
+                if document.id not in self.documents[index]:
+                    self.indices[index]["document_count"] += 1
+                ordinals = self._index_document(index, document, hashes=hashes, terms=terms)
+                CHUNKS_INDEXED.inc(len(ordinals), index=index)
+                items.append(document)
+                if ordinals:
+                    pending_vectors.append((document, ordinals))
+                # Ceder o loop entre documentos (buscas concorrentes não esperam o lote inteiro)
+                await asyncio.sleep(0)
+            timings["index"] = elapsed_ms(stage_started)
+            # Decidido sob o lock: até o backfill do índice, os vetores destes chunks ficam para ele
+            embed = index in self.vectors_ready
         
-        # Simular processamento de embeddings
-        chunks = self._chunk_text(content)
+        if embed and pending_vectors:
+            stage_started = time.perf_counter()
+            await self._index_vectors(index, pending_vectors, lock)
+            timings["embed"] = elapsed_ms(stage_started)
+        stage_started = time.perf_counter()
+        await self._flush_shards(index)
+        if self.shards is not None:
+            timings["shards"] = elapsed_ms(stage_started)
         
-        document_data = {
-            "id": document_id,
-            "content": content,
-            "metadata": metadata,
-            "chunks": chunks,
-            "added_at": datetime.now().isoformat(),
-            "embedding_model": self.embeddings_model
-        }
+        self._bump_generation(index)
         
-        self.documents[index][document_id] = document_data
-        self.indices[index]["document_count"] += 1
+        # Salvar documentos + chunks num único registro do log (a última versão de cada id prevalece;
+        # versões já substituídas em memória por outra requisição ficam para a gravação dela)
+        documents_in_memory = self.documents.get(index, {})
+        latest = {document.id: document for document in items}
+        latest = [document for document in latest.values() if documents_in_memory.get(document.id) is document]
+        stage_started = time.perf_counter()
+        await self._log({
+            "op": "save_documents",
+            "index": index,
+            "documents": latest,
+            "document_count": self.indices[index]["document_count"]
+        })
         
-        # Salvar documento
-        doc_file = self.data_dir / f"{index}_{document_id}.json"
-        import json
-        with open(doc_file, 'w', encoding='utf-8') as f:
-            json.dump(document_data, f, indent=2, ensure_ascii=False)
+        timings["persist"] = elapsed_ms(stage_started)
+        timings["total"] = elapsed_ms(started)
         
-        logger.info(f"Documento '{document_id}' adicionado ao índice '{index}'")
-        return document_data
+        DOCUMENTS_INGESTED.inc(len(items), index=index)
+        INGEST_SECONDS.observe(time.perf_counter() - started, index=index)
+        return items
     
-    async def search(self, index: str, query: str, limit: int = 5, include_metadata: bool = True):
-        """Buscar documentos no índice"""
+    async def delete_document(self, index: str, document_id: str):
+        """Remover um documento do índice.
+        Postings e referências dos chunks saem na hora (a busca deixa de vê-lo); as linhas de
+        vetores viram tombstones, descartadas depois pelo compactador em segundo plano."""
         if index not in self.indices:
             raise ValueError(f"Índice '{index}' não encontrado")
         
-        # Simulação de busca semântica (implementação básica)
-        results = []
-        documents = self.documents.get(index, {})
+        async with self.ingest_locks[index]:
+            document = self.documents[index].get(document_id)
+            if document is None:
+                raise ValueError(f"Documento '{document_id}' não encontrado no índice '{index}'")
+            self._unindex_chunks(index, document)
+            del self.documents[index][document_id]
+            self.metadata_indices[index].remove(document_id)
+            self.indices[index]["document_count"] -= 1
+        await self._flush_shards(index)
         
-        for doc_id, doc_data in documents.items():
-            # Busca simples por palavras-chave (em produção seria busca vetorial)
-            content = doc_data["content"].lower()
-            query_lower = query.lower()
-            
-            # Calcular score simples
-            score = 0.0
-            query_words = query_lower.split()
-            for word in query_words:
-                if word in content:
-                    score += content.count(word) / len(content.split())
+        self._bump_generation(index)
+        await self._log({
+            "op": "delete_documents",
+            "index": index,
+            "document_ids": [document_id],
+            "document_count": self.indices[index]["document_count"]
+        })
+        DOCUMENTS_DELETED.inc(index=index)
+        logger.info(f"Documento '{document_id}' removido do índice '{index}'")
+    
+    async def _analyze_documents(self, index: str, texts: List[str]):
+        """Chunking, hashes e termos de cada texto; textos grandes vão para o pool de processos (em paralelo)"""
+        settings = self.indices[index].get("settings") or {}
+        chunk_size = int(settings.get("chunk_size", DEFAULT_CHUNK_SIZE))
+        overlap = int(settings.get("chunk_overlap", DEFAULT_CHUNK_OVERLAP))
+        
+        async def analyze(text: str):
+            with CHUNKING_SECONDS.time():
+                if len(text) >= self.executor.offload_min_chars:
+                    return await self.executor.run_cpu(analyze_text, text, chunk_size, overlap)
+                return analyze_text(text, chunk_size, overlap)
+        
+        return await asyncio.gather(*(analyze(text) for text in texts))
+    
+    def _index_document(self, index: str, document: StoredDocument, reuse: bool = True,
+                        hashes: Optional[List[bytes]] = None, terms: Optional[List[Dict[str, int]]] = None) -> List[int]:
+        """Indexar (ou atualizar) um documento no índice invertido.
+        Com `reuse`, chunks com o mesmo conteúdo da versão anterior mantêm seus ids (e postings e
+        vetores); só os chunks novos recebem ids. Retorna os ordinais dos chunks novos.
+        `hashes` e `terms` (por chunk) podem vir pré-calculados de `analyze_text`."""
+        refs = self.chunk_refs[index]
+        lexical = self.lexical_indices[index]
+        updates = self.shard_updates.get(index)
+        previous = self.documents[index].get(document.id)
+        
+        if reuse:
+            # Chunks anteriores por hash do conteúdo (listas: o mesmo texto pode se repetir)
+            reusable = {}
+            if previous is not None:
+                for ordinal, chunk in enumerate(previous.chunks()):
+                    reusable.setdefault(chunk_hash(chunk), []).append(previous.chunk_ids[ordinal])
             
-            if score > 0:
-                result = {
-                    "document_id": doc_id,
-                    "content": doc_data["content"][:500] + "..." if len(doc_data["content"]) > 500 else doc_data["content"],
-                    "score": score
-                }
-                
-                if include_metadata:
-                    result["metadata"] = doc_data["metadata"]
-                
-                results.append(result)
+            new_ordinals = []
+            chunk_ids = []
+            if hashes is None:
+                hashes = [chunk_hash(chunk) for chunk in document.chunks()]
+            for ordinal, digest in enumerate(hashes):
+                candidates = reusable.get(digest)
+                if candidates:
+                    chunk_ids.append(candidates.pop(0))
+                else:
+                    chunk_ids.append(0)
+                    new_ordinals.append(ordinal)
+            for ordinal, chunk_id in zip(new_ordinals, refs.allocate(len(new_ordinals))):
+                chunk_ids[ordinal] = chunk_id
+            document.chunk_ids = array("I", chunk_ids)
+        else:
+            new_ordinals = list(range(len(document)))
+        
+        if previous is not None:
+            self._unindex_chunks(index, previous, keep=set(document.chunk_ids))
         
-        # Ordenar por score e limitar resultados
-        results.sort(key=lambda x: x["score"], reverse=True)
-        results = results[:limit]
+        self.documents[index][document.id] = document
+        self.metadata_indices[index].add(document.id, document.metadata, document.added_at)
+        refs.assign(document.id, document.chunk_ids)
+        for ordinal in new_ordinals:
+            if updates is not None:
+                chunk_terms = terms[ordinal] if terms else dict(Counter(tokenize(document.chunk(ordinal))))
+                self.collection_stats[index].add(chunk_terms)
+                updates.add_chunk(document.id, document.chunk_ids[ordinal], document.chunk(ordinal), chunk_terms)
+            else:
+                lexical.add(document.chunk_ids[ordinal], document.chunk(ordinal), terms[ordinal] if terms else None)
         
-        logger.info(f"Busca por '{query}' retornou {len(results)} resultados")
-        return results
+        return new_ordinals
     
-    def _chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200):
-        """Dividir texto em chunks"""
-        chunks = []
-        words = text.split()
+    def search_mode(self, mode: Optional[str] = None) -> str:
+        """Modo efetivo da busca: sem modelo de embeddings (ou enquanto ele carrega e os vetores
+        pendentes são calculados), só a busca lexical está disponível"""
+        if self.model_state != "ready":
+            return "lexical"
+        return mode or "vector"
+    
+    async def search(self, index: str, query: str, limit: int = 5, include_metadata: bool = True,
+                     mode: Optional[str] = None, weights: Optional[Dict[str, float]] = None,
+                     rrf_k: int = RRF_K, filters: Optional[Dict[str, Any]] = None, cursor: Optional[str] = None,
+                     explain: bool = False, timings: Optional[Dict[str, float]] = None,
+                     page: Optional[Dict[str, Any]] = None):
+        """Buscar documentos no índice (modo lexical, vetorial ou híbrido).
+        `filters` restringe os documentos candidatos antes da pontuação; sem texto na consulta,
+        retorna os documentos filtrados mais recentes. `cursor` (o `next_cursor` da página anterior)
+        continua a mesma busca na página seguinte. Com `explain`, cada resultado traz a decomposição
+        do score e `page["explain"]` os candidatos examinados (a busca ignora os caches).
+        Se `timings` for um dicionário, recebe a duração de cada etapa em milissegundos;
+        se `page` for um dicionário, recebe o `next_cursor` (None na última página)."""
+        return list(await self.search_stream(index, query, limit, include_metadata, mode, weights, rrf_k,
+                                             filters, cursor, explain, timings, page))
+    
+    async def search_stream(self, index: str, query: str, limit: int = 5, include_metadata: bool = True,
+                            mode: Optional[str] = None, weights: Optional[Dict[str, float]] = None,
+                            rrf_k: int = RRF_K, filters: Optional[Dict[str, Any]] = None,
+                            cursor: Optional[str] = None, explain: bool = False,
+                            timings: Optional[Dict[str, float]] = None,
+                            page: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """Mesma busca de `search`, mas retorna um gerador que monta os resultados um a um.
+        A pontuação (e qualquer erro de índice ou cursor) acontece aqui; o gerador só formata."""
+        plan = self._plan_search(index, query, limit, include_metadata, mode, weights, rrf_k, filters, cursor,
+                                 explain, timings)
+        page = {} if page is None else page
+        # Com explain a busca é sempre recalculada: os caches não guardam os scores por componente
+        cached = None if explain else self._cached_results(plan)
+        if cached is not None:
+            results, page["next_cursor"] = cached
+            return iter(results)
+        ranking = None if explain else self._cached_ranking(plan)
+        if ranking is None:
+            self._apply_filters(plan)
+            ranking = await self._rank_documents(plan, await self._search_hits(plan))
+        if explain:
+            await self._explain(plan, ranking)
+        return self._page_results(plan, ranking, page)
+    
+    async def search_batch(self, searches: List[Dict[str, Any]], timings: Optional[Dict[str, float]] = None):
+        """Várias buscas (em um ou mais índices) numa única chamada.
+        Todas as consultas vetoriais são embutidas num único lote e, por índice, pontuadas com um
+        produto matriz-matriz. Retorna um item por busca, na ordem recebida; um índice inexistente
+        (ou um cursor inválido) gera erro só no seu item."""
+        started = time.perf_counter()
+        timings = {} if timings is None else timings
+        outcomes: List[Optional[Dict[str, Any]]] = [None] * len(searches)
+        plans = []
+        for position, search in enumerate(searches):
+            try:
+                plan = self._plan_search(timings={}, **search)
+            except ValueError as e:
+                outcomes[position] = {"success": False, "error": str(e)}
+                continue
+            cached = None if plan.explain else self._cached_results(plan)
+            if cached is not None:
+                results, next_cursor = cached
+                outcomes[position] = self._batch_outcome(plan, results, next_cursor)
+                continue
+            ranking = None if plan.explain else self._cached_ranking(plan)
+            if ranking is not None:
+                results = list(self._page_results(plan, ranking, {}))
+                outcomes[position] = self._batch_outcome(plan, results, plan.next_cursor)
+                continue
+            self._apply_filters(plan)
+            plans.append((position, plan))
+        
+        # Um único lote de embeddings para todas as consultas (textos repetidos uma vez só)
+        texts = list(dict.fromkeys(plan.query for _, plan in plans if self._needs_query_vector(plan)))
+        if texts:
+            embed_started = time.perf_counter()
+            query_vectors = dict(zip(texts, await self._embed(texts)))
+            timings["embed"] = elapsed_ms(embed_started)
+            for _, plan in plans:
+                if self._needs_query_vector(plan):
+                    plan.query_vector = query_vectors[plan.query]
+        
+        # Consultas sem filtro por índice: um produto matriz-matriz em vez de um por consulta
+        groups: Dict[str, List[Tuple[int, SearchPlan]]] = {}
+        for position, plan in plans:
+            if plan.query_vector is not None and plan.candidates is None and self.ann_indices.get(plan.index) is None \
+                    and not plan.explain:
+                groups.setdefault(plan.index, []).append((position, plan))
+        vector_started = time.perf_counter()
+        grouped = await asyncio.gather(*(
+            self._vector_hits_many(index, [plan.query_vector for _, plan in members],
+                                   max(plan.k for _, plan in members))
+            for index, members in groups.items()
+        ))
+        vector_hits = {}
+        for members, hits in zip(groups.values(), grouped):
+            for (position, plan), plan_hits in zip(members, hits):
+                vector_hits[position] = plan_hits[:plan.k]
+        if groups:
+            timings["vector"] = elapsed_ms(vector_started)
+        
+        async def rank(position: int, plan: SearchPlan):
+            ranking = await self._rank_documents(plan, await self._search_hits(plan, vector_hits.get(position)))
+            if plan.explain:
+                await self._explain(plan, ranking)
+            return ranking
         
-        for i in range(0, len(words), chunk_size - overlap):
-            chunk = " ".join(words[i:i + chunk_size])
-            chunks.append(chunk)
+        rankings = await asyncio.gather(*(rank(position, plan) for position, plan in plans))
+        for (position, plan), ranking in zip(plans, rankings):
+            results = list(self._page_results(plan, ranking, {}))
+            outcomes[position] = self._batch_outcome(plan, results, plan.next_cursor)
         
-        return chunks
+        timings["total"] = elapsed_ms(started)
+        logger.info(f"Lote de {len(searches)} buscas concluído em {timings['total']:.1f}ms")
+        return outcomes
+    
+    def _batch_outcome(self, plan: "SearchPlan", results: List[Dict[str, Any]],
+                       next_cursor: Optional[str]) -> Dict[str, Any]:
+        outcome = {"success": True, "results": results, "next_cursor": next_cursor, "mode": plan.mode,
+                   "timings": plan.timings}
+        if plan.explain:
+            outcome["explain"] = plan.examined
+        return outcome
+    
+    def _plan_search(self, index: str, query: str, limit: int = 5, include_metadata: bool = True,
+                     mode: Optional[str] = None, weights: Optional[Dict[str, float]] = None,
+                     rrf_k: int = RRF_K, filters: Optional[Dict[str, Any]] = None, cursor: Optional[str] = None,
+                     explain: bool = False, timings: Optional[Dict[str, float]] = None) -> "SearchPlan":
+        """Resolver os parâmetros de uma busca, a página pedida e as chaves de cache"""
+        if index not in self.indices:
+            raise ValueError(f"Índice '{index}' não encontrado")
+        
+        plan = SearchPlan()
+        plan.started = time.perf_counter()
+        plan.timings = {} if timings is None else timings
+        plan.index = index
+        plan.query = query
+        plan.limit = limit
+        plan.include_metadata = include_metadata
+        plan.mode = self.search_mode(mode)
+        plan.weights = {**DEFAULT_FUSION_WEIGHTS, **(weights or {})}
+        plan.rrf_k = rrf_k
+        plan.filters = validate_filters(filters) if filters else None
+        plan.generation = self.generations[index]
+        # O ranking não depende do tamanho da página: páginas da mesma busca compartilham a chave
+        plan.ranking_key = (index, " ".join(query.lower().split()), plan.mode,
+                            tuple(sorted(plan.weights.items())) if plan.mode == "hybrid" else None,
+                            rrf_k if plan.mode == "hybrid" else None,
+                            json.dumps(plan.filters, sort_keys=True) if plan.filters else None,
+                            plan.generation)
+        plan.offset = self._decode_cursor(plan, cursor) if cursor else 0
+        plan.depth = plan.offset + limit
+        # Buscar mais chunks que o necessário, pois vários podem pertencer ao mesmo documento
+        plan.k = plan.depth * 4
+        plan.matched = plan.candidates = plan.query_vector = plan.previous = plan.next_cursor = None
+        plan.exhausted = False
+        plan.explain = explain
+        # Só com explain: candidatos examinados por etapa, rankings de cada componente e decomposições
+        plan.examined = {} if explain else None
+        plan.components = plan.explanations = None
+        plan.cache_key = (*plan.ranking_key, limit, include_metadata, plan.offset)
+        return plan
+    
+    def _cursor_fingerprint(self, plan: "SearchPlan") -> str:
+        """Resumo da busca (sem a geração) gravado no cursor: um cursor só vale para a mesma busca"""
+        return hashlib.blake2b(repr(plan.ranking_key[:-1]).encode("utf-8"), digest_size=8).hexdigest()
+    
+    def _encode_cursor(self, plan: "SearchPlan", offset: int) -> str:
+        token = json.dumps({"g": plan.generation, "o": offset, "f": self._cursor_fingerprint(plan)},
+                           separators=(",", ":"))
+        return base64.urlsafe_b64encode(token.encode("utf-8")).decode("ascii").rstrip("=")
+    
+    def _decode_cursor(self, plan: "SearchPlan", cursor: str) -> int:
+        """Posição da página apontada pelo cursor (válido só na mesma geração do índice)"""
+        try:
+            token = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            generation, offset, fingerprint = int(token["g"]), int(token["o"]), token["f"]
+        except Exception:
+            raise InvalidCursor("Cursor inválido")
+        if fingerprint != self._cursor_fingerprint(plan) or offset < 0:
+            raise InvalidCursor("O cursor pertence a outra busca")
+        if generation != plan.generation:
+            raise ExpiredCursor("Cursor expirado: o índice mudou desde a primeira página; refaça a busca")
+        return offset
+    
+    def _cached_results(self, plan: "SearchPlan") -> Optional[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        """(resultados, next_cursor) em cache para a chave da busca (cópias), ou None"""
+        counters = self.search_cache_stats[plan.index]
+        cached = self.search_cache.get(plan.cache_key)
+        if cached is None:
+            counters["misses"] += 1
+            return None
+        counters["hits"] += 1
+        plan.timings["cache"] = elapsed_ms(plan.started)
+        plan.timings["total"] = plan.timings["cache"]
+        self._observe_search(plan)
+        results, next_cursor = cached
+        return [dict(result) for result in results], next_cursor
+    
+    def _cached_ranking(self, plan: "SearchPlan") -> Optional[List[Tuple[str, int, float]]]:
+        """Ranking por documento já calculado para esta busca, se cobre a página pedida.
+        Se não cobre, ele vira o prefixo da próxima busca (com o dobro da profundidade)."""
+        entry = self.rankings.get(plan.ranking_key)
+        if entry is None:
+            return None
+        ranking, exhausted, k = entry
+        if exhausted or len(ranking) >= plan.depth:
+            plan.exhausted = exhausted
+            plan.timings["ranking"] = elapsed_ms(plan.started)
+            return ranking
+        plan.previous = ranking
+        plan.k = max(plan.k, k * 2)
+        return None
+    
+    def _apply_filters(self, plan: "SearchPlan"):
+        """Filtros viram um conjunto de chunks candidatos (consulta aos índices secundários)"""
+        if not plan.filters:
+            return
+        filter_started = time.perf_counter()
+        documents = self.documents[plan.index]
+        plan.matched = self.metadata_indices[plan.index].match(plan.filters)
+        plan.candidates = {chunk_id for document_id in plan.matched for chunk_id in documents[document_id].chunk_ids}
+        plan.timings["filter"] = elapsed_ms(filter_started)
+    
+    def _needs_query_vector(self, plan: "SearchPlan") -> bool:
+        """A busca vai pontuar vetores (modo vetorial/híbrido, texto na consulta e vetores no índice)"""
+        if plan.mode == "lexical" or not plan.query.strip():
+            return False
+        if plan.candidates is not None and not plan.candidates:
+            return False
+        store = self.vector_stores.get(plan.index)
+        return store is not None and len(store) > 0
+    
+    async def _search_hits(self, plan: "SearchPlan",
+                           vector_hits: Optional[List[Tuple[int, float]]] = None) -> List[Tuple[int, float]]:
+        """Top-k (chunk_id, score) ordenados da busca; `vector_hits` pode vir pronto (lote).
+        Marca `plan.exhausted` quando a busca devolveu menos que k, ou seja, tudo o que havia."""
+        index, query, k, timings, candidates = plan.index, plan.query, plan.k, plan.timings, plan.candidates
+        examined = plan.examined
+        if not query.strip():
+            hits = self._recent_hits(index, plan.matched, k // 4)
+            plan.exhausted = len(hits) < k // 4
+            return hits
+        if candidates is not None and not candidates:
+            plan.exhausted = True
+            return []
+        
+        async def vector_search():
+            # O vetor da consulta fica no plano: buscas mais fundas (páginas seguintes) não embutem de novo
+            if plan.query_vector is None and self._needs_query_vector(plan):
+                embed_started = time.perf_counter()
+                plan.query_vector = (await self._embed([query]))[0]
+                timings["embed"] = elapsed_ms(embed_started)
+            return await self._vector_hits(index, query, k, timings, candidates=candidates,
+                                           query_vector=plan.query_vector, examined=examined)
+        
+        if plan.mode == "lexical":
+            hits = await self._lexical_hits(index, query, k, timings, candidates=candidates, examined=examined)
+        elif plan.mode == "vector":
+            hits = vector_hits if vector_hits is not None else await vector_search()
+        else:
+            # As duas buscas rodam juntas: a lexical numa thread enquanto a consulta é embutida
+            lexical_search = self._lexical_hits(index, query, k, timings, candidates=candidates, examined=examined)
+            if vector_hits is not None:
+                lexical_hits = await lexical_search
+            else:
+                lexical_hits, vector_hits = await asyncio.gather(lexical_search, vector_search())
+            fusion_started = time.perf_counter()
+            fused = self._fuse_hits(index, {"lexical": lexical_hits, "vector": vector_hits}, plan.weights,
+                                    plan.rrf_k, k + 1)
+            timings["fusion"] = elapsed_ms(fusion_started)
+            if plan.explain:
+                plan.components = {"lexical": lexical_hits, "vector": vector_hits}
+            plan.exhausted = len(lexical_hits) < k and len(vector_hits) < k and len(fused) <= k
+            return fused[:k]
+        plan.exhausted = len(hits) < k
+        return hits
+    
+    async def _rank_documents(self, plan: "SearchPlan", hits: List[Tuple[int, float]]) -> List[Tuple[str, int, float]]:
+        """Ranking por documento (id, ordinal do melhor chunk, score) que cobre a página pedida.
+        Se os chunks encontrados não bastam (vários do mesmo documento), busca de novo com o dobro
+        de k. O ranking fica em cache para as páginas seguintes da mesma geração do índice."""
+        ranking = self._extend_ranking(plan, hits)
+        while len(ranking) < plan.depth and not plan.exhausted:
+            plan.previous = ranking
+            plan.k *= 2
+            ranking = self._extend_ranking(plan, await self._search_hits(plan))
+        if self.generations.get(plan.index) == plan.generation:
+            self.rankings.put(plan.ranking_key, (ranking, plan.exhausted, plan.k))
+        return ranking
+    
+    def _extend_ranking(self, plan: "SearchPlan", hits: List[Tuple[int, float]]) -> List[Tuple[str, int, float]]:
+        """Acrescentar ao ranking anterior da busca os documentos novos de `hits`.
+        O prefixo já entregue não muda, mesmo que empates se reordenem numa busca mais funda."""
+        refs = self.chunk_refs[plan.index]
+        ranking = list(plan.previous or ())
+        seen = {document_id for document_id, _, _ in ranking}
+        for chunk_id, score in hits:
+            ref = refs.get(chunk_id)
+            if ref is None or ref[0] in seen:
+                continue
+            seen.add(ref[0])
+            ranking.append((ref[0], ref[1], score))
+        return ranking
+    
+    def _page_results(self, plan: "SearchPlan", ranking: List[Tuple[str, int, float]],
+                      page: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Montar os resultados da página um a um; ao final, guardar no cache e preencher `page`"""
+        collect_started = time.perf_counter()
+        documents = self.documents[plan.index]
+        results = []
+        for document_id, ordinal, score in ranking[plan.offset:plan.offset + plan.limit]:
+            document = documents.get(document_id)
+            # Em streaming o índice pode mudar entre dois resultados
+            if document is None or ordinal >= len(document.chunk_ids):
+                continue
+            result = self._format_result(document_id, document, document.chunk(ordinal), score, plan.include_metadata)
+            result["chunk_index"] = ordinal
+            if plan.explanations is not None:
+                result["explain"] = plan.explanations.get(document_id)
+            results.append(dict(result))
+            yield result
+        plan.timings["collect"] = elapsed_ms(collect_started)
+        page["next_cursor"] = self._finish_search(plan, ranking, results)
+        if plan.explain:
+            page["explain"] = plan.examined
+    
+    def _finish_search(self, plan: "SearchPlan", ranking: List[Tuple[str, int, float]],
+                       results: List[Dict[str, Any]]) -> Optional[str]:
+        """Cursor da próxima página, cache e tempos da busca; retorna o cursor"""
+        end = plan.offset + plan.limit
+        if results and (len(ranking) > end or not plan.exhausted):
+            plan.next_cursor = self._encode_cursor(plan, end)
+        
+        # Só guardar se o índice não mudou durante a busca (e sem as decomposições do explain)
+        if self.generations.get(plan.index) == plan.generation and not plan.explain:
+            self.search_cache.put(plan.cache_key, (results, plan.next_cursor))
+        
+        plan.timings["total"] = elapsed_ms(plan.started)
+        self._observe_search(plan)
+        logger.info(f"Busca {plan.mode} por '{plan.query}' retornou {len(results)} resultados "
+                    f"(a partir do {plan.offset + 1}º) em {plan.timings['total']:.1f}ms")
+        return plan.next_cursor
+    
+    async def _explain(self, plan: "SearchPlan", ranking: List[Tuple[str, int, float]]):
+        """Decompor o score de cada resultado da página (só com explain: true): contribuição BM25 de
+        cada termo, similaridade de cosseno do chunk e, no híbrido, a posição em cada ranking fundido"""
+        started = time.perf_counter()
+        index, query = plan.index, plan.query
+        documents = self.documents[index]
+        page = [(document_id, ordinal, score) for document_id, ordinal, score in ranking[plan.offset:plan.offset + plan.limit]
+                if document_id in documents and ordinal < len(documents[document_id].chunk_ids)]
+        plan.examined["documents"] = len(ranking)
+        if plan.candidates is not None:
+            plan.examined["filtered"] = len(plan.candidates)
+        
+        lexical = plan.mode != "vector" and bool(query.strip())
+        if lexical:
+            collection = (self.collection_stats[index] if self.shards is not None else self.lexical_indices[index]).for_query(query)
+        
+        similarities = {}
+        if plan.mode != "lexical" and self._needs_query_vector(plan):
+            if plan.query_vector is None:
+                plan.query_vector = (await self._embed([query]))[0]
+            chunk_ids = np.array([documents[document_id].chunk_ids[ordinal] for document_id, ordinal, _ in page],
+                                 dtype=np.int64)
+            ids, scores = await self.executor.run_io(
+                self.vector_stores[index].search, plan.query_vector, len(chunk_ids), chunk_ids
+            )
+            similarities = dict(zip(ids.tolist(), scores.tolist()))
+        
+        ranks = {}
+        if plan.components is not None:
+            refs = self.chunk_refs[index]
+            for name, hits in plan.components.items():
+                positions = ranks[name] = {}
+                for chunk_id, _ in hits:
+                    ref = refs.get(chunk_id)
+                    if ref is not None and ref[0] not in positions:
+                        positions[ref[0]] = len(positions) + 1
+        
+        plan.explanations = {}
+        for document_id, ordinal, score in page:
+            document = documents[document_id]
+            chunk_id = document.chunk_ids[ordinal]
+            explanation = {"chunk_id": chunk_id, "score": score}
+            if not query.strip():
+                explanation["reason"] = "recent"
+            if lexical:
+                terms = explain_bm25(query, document.chunk(ordinal), collection)
+                explanation["terms"] = terms
+                explanation["bm25"] = sum(terms.values())
+            if chunk_id in similarities:
+                explanation["vector_similarity"] = similarities[chunk_id]
+            if ranks:
+                explanation["fusion"] = {}
+                for name, positions in ranks.items():
+                    rank = positions.get(document_id)
+                    explanation["fusion"][name] = {
+                        "rank": rank,
+                        "contribution": plan.weights.get(name, 1.0) / (plan.rrf_k + rank) if rank else 0.0
+                    }
+            plan.explanations[document_id] = explanation
+        plan.timings["explain"] = elapsed_ms(started)
+    
+    def _observe_search(self, plan: "SearchPlan"):
+        SEARCH_SECONDS.observe(plan.timings["total"] / 1000, index=plan.index, mode=plan.mode)
+        for stage, duration in plan.timings.items():
+            if stage != "total":
+                SEARCH_STAGE_SECONDS.observe(duration / 1000, stage=stage)
+    
+    async def _embed(self, texts: List[str]):
+        """Embeddings via cache por conteúdo; só textos inéditos vão para o modelo (em lote)"""
+        keys = [EmbeddingCache.key(text, self.embeddings_model) for text in texts]
+        vectors = self.embedding_cache.get_many(keys)
+        absent = [key for key, vector in zip(keys, vectors) if vector is None]
+        if absent:
+            # Nível em disco (SQLite) numa thread do executor
+            found = await self.executor.run_io(self.embedding_cache.read_many, absent)
+            if found:
+                self.embedding_cache.promote(found)
+                vectors = [vector if vector is not None else found.get(key) for key, vector in zip(keys, vectors)]
+        
+        # Textos repetidos no mesmo pedido são codificados uma única vez
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], texts[i])
+        
+        if missing:
+            missing_keys = list(missing)
+            encoded = await self.batcher.encode([missing[key] for key in missing_keys])
+            self.embedding_cache.put_many(missing_keys, encoded)
+            # Gravação em disco na thread de escrita, sem esperar: a busca não fica atrás do log
+            self._spawn(self.executor.run_write(self.embedding_cache.write_many, missing_keys, encoded))
+            computed = dict(zip(missing_keys, encoded))
+            vectors = [vector if vector is not None else computed[key] for key, vector in zip(keys, vectors)]
+        
+        return np.stack(vectors)
+    
+    def _encode(self, texts: List[str]):
+        """Calcular embeddings de uma lista de textos"""
+        TEXTS_EMBEDDED.inc(len(texts))
+        with EMBEDDING_SECONDS.time():
+            return self.encoder.encode(texts, batch_size=self.batch_size, convert_to_numpy=True, show_progress_bar=False)
+    
+    def _unindex_chunks(self, index: str, document: StoredDocument, keep=frozenset()):
+        """Remover postings e referências dos chunks de uma versão anterior do documento
+        (exceto os ids em `keep`); os vetores obsoletos ficam no VectorStore e são ignorados na busca"""
+        refs = self.chunk_refs[index]
+        lexical = self.lexical_indices[index]
+        updates = self.shard_updates.get(index)
+        for ordinal, chunk_id in enumerate(document.chunk_ids):
+            if chunk_id not in keep:
+                if updates is not None:
+                    self.collection_stats[index].remove(document.chunk(ordinal))
+                    updates.remove_chunk(document.id, chunk_id, document.chunk(ordinal))
+                else:
+                    lexical.remove(chunk_id, document.chunk(ordinal))
+                refs.release(chunk_id)
+                self.tombstones[index] += 1
+    
+    async def _index_vectors(self, index: str, items: List[Tuple[StoredDocument, List[int]]], lock: asyncio.Lock):
+        """Calcular (num único lote) e armazenar os embeddings de (documento, ordinais dos chunks).
+        O modelo roda fora do lock de ingestão; a gravação acontece sob ele. `lock` é o lock sob o qual
+        os chunks foram indexados: se o índice foi recriado desde então, os vetores são descartados."""
+        vectors = await self._embed([document.chunk(ordinal) for document, ordinals in items for ordinal in ordinals])
+        async with lock:
+            if self.ingest_locks.get(index) is not lock:
+                # Índice removido (ou recriado) enquanto os embeddings eram calculados
+                return
+            await self._store_vectors(index, items, vectors)
+    
+    async def _store_vectors(self, index: str, items: List[Tuple[StoredDocument, List[int]]], vectors):
+        """Gravar embeddings já calculados no VectorStore (segmentos em disco) e no grafo HNSW numa
+        thread do executor. Quem chama segura o lock de ingestão: as linhas entram no grafo em ordem."""
+        ids = [document.chunk_ids[ordinal] for document, ordinals in items for ordinal in ordinals]
+        store = self.vector_stores.get(index)
+        if store is None:
+            settings = self.indices[index].get("settings") or {}
+            store = VectorStore(
+                dim=vectors.shape[1],
+                directory=self._vectors_dir(index),
+                model=self.embeddings_model,
+                quantization=settings.get("quantization"),
+                rescore_factor=int(settings.get("rescore_factor", 4))
+            )
+            self.vector_stores[index] = store
+            if self._ann_settings(index) is not None:
+                await self._attach_ann(index, store)
+        
+        ann = self.ann_indices.get(index)
+        
+        def append():
+            start = len(store)
+            store.add(ids, vectors)
+            if ann is not None:
+                for position in range(start, len(store)):
+                    ann.add(position, store.vectors_at([position])[0])
+        
+        await self.executor.run_io(append)
+        
+        updates = self.shard_updates.get(index)
+        if updates is not None:
+            updates.add_vectors([document.id for document, ordinals in items for _ in ordinals], ids, vectors)
+    
+    async def _flush_shards(self, index: str):
+        """Enviar aos shards as alterações acumuladas do índice (uma mensagem por shard)"""
+        updates = self.shard_updates.get(index)
+        if updates is not None:
+            await self.shards.scatter(updates.take(index))
+    
+    async def _seed_shard_vectors(self, index: str, store):
+        """Distribuir entre os shards os vetores persistidos de chunks ainda válidos"""
+        refs = self.chunk_refs[index]
+        updates = self.shard_updates[index]
+        ids = store.ids()
+        for start in range(0, len(ids), SEED_BATCH_ROWS):
+            positions = []
+            document_ids = []
+            for position in range(start, min(start + SEED_BATCH_ROWS, len(ids))):
+                ref = refs.get(int(ids[position]))
+                if ref is not None:
+                    positions.append(position)
+                    document_ids.append(ref[0])
+            if positions:
+                updates.add_vectors(document_ids, ids[positions].tolist(), store.vectors_at(positions))
+            await self._flush_shards(index)
+    
+    def _shard_queries(self, index: str, operation: str, query, k: int,
+                       candidates: Optional[Set[int]], *extra) -> List[Optional[tuple]]:
+        """Mensagens de busca por shard; os candidatos filtrados vão só para o shard do seu documento"""
+        count = self.shards.count
+        if candidates is None:
+            return [(operation, index, query, k, None, *extra)] * count
+        refs = self.chunk_refs[index]
+        parts = [set() for _ in range(count)]
+        shard_by_document = {}
+        for chunk_id in candidates:
+            ref = refs.get(chunk_id)
+            if ref is None:
+                continue
+            shard = shard_by_document.get(ref[0])
+            if shard is None:
+                shard = shard_by_document[ref[0]] = shard_of(ref[0], count)
+            parts[shard].add(chunk_id)
+        return [(operation, index, query, k, part, *extra) if part else None for part in parts]
+    
+    def _ann_settings(self, index: str) -> Optional[Dict[str, int]]:
+        """Parâmetros do HNSW se o índice foi criado com settings {"ann": "hnsw"}"""
+        settings = self.indices[index].get("settings") or {}
+        # Com shards, cada processo de shard mantém o grafo da sua partição
+        if HNSWIndex is None or settings.get("ann") != "hnsw" or self.shards is not None:
+            return None
+        return {
+            "M": int(settings.get("hnsw_m", 16)),
+            "ef_construction": int(settings.get("hnsw_ef_construction", 100)),
+            "ef_search": int(settings.get("hnsw_ef_search", 64))
+        }
+    
+    async def _attach_ann(self, index: str, store):
+        """Carregar (ou criar) o grafo HNSW do índice e inserir as linhas que faltam, numa thread
+        do executor (quem chama segura o lock de ingestão do índice ou ainda está na recarga)"""
+        params = self._ann_settings(index)
+        
+        def build():
+            ann = HNSWIndex.load(store.directory, store.vectors_at, **params)
+            for position in range(len(ann), len(store)):
+                ann.add(position, store.vectors_at([position])[0])
+            return ann
+        
+        self.ann_indices[index] = await self.executor.run_io(build)
+    
+    def _vectors_dir(self, index: str) -> Path:
+        """Diretório dos segmentos de embeddings de um índice"""
+        safe_name = re.sub(r"[^\w.-]", "_", index)
+        digest = hashlib.sha1(index.encode("utf-8")).hexdigest()[:8]
+        return self.data_dir / "vectors" / f"{safe_name}-{digest}"
+    
+    async def _vector_hits(self, index: str, query: str, k: int, timings: Dict[str, float],
+                           candidates: Optional[Set[int]] = None, query_vector=None,
+                           examined: Optional[Dict[str, Any]] = None):
+        """Busca vetorial: um produto matriz-vetor + seleção parcial top-k; retorna (chunk_id, score).
+        `examined` (explain) recebe em "vector" as linhas pontuadas (ou os nós visitados no HNSW)."""
+        store = self.vector_stores.get(index)
+        if store is None or len(store) == 0:
+            return []
+        
+        if query_vector is None:
+            started = time.perf_counter()
+            query_vector = (await self._embed([query]))[0]
+            timings["embed"] = elapsed_ms(started)
+        
+        started = time.perf_counter()
+        k = min(len(store), k)
+        ann = self.ann_indices.get(index)
+        # Pontuação fora do loop (o produto de matrizes do numpy libera o GIL)
+        if self.shards is not None:
+            # Scatter-gather: cada shard pontua a sua partição; o coordenador junta os top-k
+            parts = await self.shards.scatter(self._shard_queries(index, "vector", query_vector, k, candidates))
+            timings["vector"] = elapsed_ms(started)
+            if examined is not None:
+                # Nós visitados pelo HNSW dos shards não são medidos (None)
+                if candidates is not None:
+                    examined["vector"] = len(candidates)
+                else:
+                    settings = self.indices[index].get("settings") or {}
+                    examined["vector"] = None if settings.get("ann") == "hnsw" else len(store)
+            return merge_hits(parts, k)
+        stats = None
+        if candidates is not None:
+            # Candidatos filtrados: pontuação exata só das linhas desses chunks
+            ids, scores = await self.executor.run_io(
+                store.search, query_vector, k, np.fromiter(candidates, dtype=np.int64)
+            )
+        elif ann is not None:
+            stats = {} if examined is not None else None
+            positions, scores = await self.executor.run_io(
+                ann.search, query_vector / (np.linalg.norm(query_vector) or 1.0), k, None, stats
+            )
+            ids = store.ids_at(positions)
+        else:
+            ids, scores = await self.executor.run_io(store.search, query_vector, k)
+        hits = list(zip(ids.tolist(), scores.tolist()))
+        timings["vector"] = elapsed_ms(started)
+        if examined is not None:
+            if stats is not None:
+                examined["vector"] = stats.get("visited", 0)
+            else:
+                examined["vector"] = len(candidates) if candidates is not None else len(store)
+        return hits
+    
+    async def _vector_hits_many(self, index: str, query_vectors: List, k: int) -> List[List[Tuple[int, float]]]:
+        """Busca vetorial exaustiva de várias consultas no mesmo índice (produto matriz-matriz)"""
+        store = self.vector_stores.get(index)
+        if store is None:
+            return [[] for _ in query_vectors]
+        k = min(len(store), k)
+        if self.shards is not None:
+            parts = await self.shards.broadcast("vector_many", index, np.stack(query_vectors), k)
+            return [merge_hits([shard[position] for shard in parts], k) for position in range(len(query_vectors))]
+        results = await self.executor.run_io(store.search_many, np.stack(query_vectors), k)
+        return [list(zip(ids.tolist(), scores.tolist())) for ids, scores in results]
+    
+    async def _lexical_hits(self, index: str, query: str, k: int, timings: Dict[str, float],
+                            candidates: Optional[Set[int]] = None, examined: Optional[Dict[str, Any]] = None):
+        """Busca BM25 no índice invertido (apenas chunks que contêm os termos); retorna (chunk_id, score).
+        `examined` (explain) recebe em "lexical" os chunks pontuados."""
+        started = time.perf_counter()
+        if self.shards is not None:
+            # Estatísticas globais (df, tamanho médio) junto da consulta: scores iguais aos de um índice único
+            collection = self.collection_stats[index].for_query(query)
+            parts = await self.shards.scatter(self._shard_queries(index, "lexical", query, k, candidates, collection))
+            hits = merge_hits(parts, k)
+        else:
+            hits = await self.executor.run_io(self.lexical_indices[index].search, query, k, candidates)
+        timings["lexical"] = elapsed_ms(started)
+        if examined is not None:
+            if self.shards is not None:
+                examined["lexical"] = sum(await self.shards.broadcast("matching", index, query, candidates))
+            else:
+                examined["lexical"] = self.lexical_indices[index].matching(query, candidates)
+        return hits
+    
+    def _recent_hits(self, index: str, document_ids: Optional[Set[str]], limit: int) -> List[Tuple[int, float]]:
+        """Consulta sem texto: primeiro chunk dos documentos (filtrados) mais recentes"""
+        documents = self.documents[index]
+        selected = documents.values() if document_ids is None else (documents[i] for i in document_ids)
+        recent = heapq.nlargest(limit, (document for document in selected if document.chunk_ids),
+                                key=lambda document: (document.added_at, document.id))
+        return [(document.chunk_ids[0], 1.0) for document in recent]
+    
+    def _fuse_hits(self, index: str, rankings: Dict[str, List[Tuple[int, float]]], weights: Dict[str, float],
+                   rrf_k: int, limit: int) -> List[Tuple[int, float]]:
+        """Reciprocal rank fusion por documento: score = soma de peso / (rrf_k + posição) em cada ranking.
+        Cada documento é representado pelo chunk com a maior contribuição; retorna os `limit` melhores
+        (seleção parcial com heap, sem ordenar todos os documentos)."""
+        refs = self.chunk_refs[index]
+        fused = {}
+        for name, hits in rankings.items():
+            weight = weights.get(name, 1.0)
+            rank = 0
+            seen = set()
+            for chunk_id, _ in hits:
+                ref = refs.get(chunk_id)
+                if ref is None or ref[0] in seen:
+                    continue
+                seen.add(ref[0])
+                rank += 1
+                contribution = weight / (rrf_k + rank)
+                entry = fused.get(ref[0])
+                if entry is None:
+                    fused[ref[0]] = [contribution, contribution, chunk_id]
+                else:
+                    entry[0] += contribution
+                    if contribution > entry[1]:
+                        entry[1], entry[2] = contribution, chunk_id
+        
+        ranked = heapq.nlargest(limit, fused.values(), key=lambda entry: entry[0])
+        return [(chunk_id, score) for score, _, chunk_id in ranked]
+    
+    def _format_result(self, doc_id: str, document: StoredDocument, text: str, score: float, include_metadata: bool):
+        """Montar um resultado de busca"""
+        result = {
+            "document_id": doc_id,
+            "content": text[:500] + "..." if len(text) > 500 else text,
+            "score": score
+        }
+        
+        if include_metadata:
+            result["metadata"] = document.metadata
+        
+        return result
+    
+    def _chunk_spans(self, settings: Dict, text: str):
+        """Offsets (início, fim) dos chunks do texto, com os parâmetros de chunking do índice"""
+        return iter_chunk_spans(
+            text,
+            chunk_size=int(settings.get("chunk_size", DEFAULT_CHUNK_SIZE)),
+            overlap=int(settings.get("chunk_overlap", DEFAULT_CHUNK_OVERLAP))
+        )
+    
+    async def compact_vectors(self, index: str) -> int:
+        """Reescrever os vetores do índice sem as linhas de chunks removidos (tombstones) e recriar
+        o grafo HNSW. A cópia roda numa thread enquanto a store antiga continua atendendo buscas;
+        retorna as linhas descartadas."""
+        store = self.vector_stores.get(index)
+        if store is None or not self.tombstones.get(index):
+            return 0
+        started = time.perf_counter()
+        refs = self.chunk_refs[index]
+        snapshot = len(store)
+        ids = store.ids()
+        live = await self.executor.run_io(
+            lambda: np.fromiter((refs.get(chunk_id) is not None for chunk_id in ids.tolist()), dtype=bool, count=snapshot)
+        )
+        directory = self._vectors_dir(index)
+        target = directory.with_name(directory.name + ".compact")
+        await self.executor.run_io(shutil.rmtree, target, True)
+        compacted = await self.executor.run_io(store.compacted, np.flatnonzero(live), target)
+        ann = None
+        params = self._ann_settings(index)
+        if params is not None and self.vector_stores.get(index) is store:
+            ann = HNSWIndex(compacted.vectors_at, **params)
+            await self.executor.run_io(lambda: [ann.add(position, compacted.vectors_at([position])[0])
+                                                for position in range(len(compacted))])
+        lock = self.ingest_locks.get(index)
+        if lock is None or self.vector_stores.get(index) is not store:
+            # Índice removido ou recriado durante a cópia
+            self._discard_directory(target)
+            return 0
+        
+        # Sob o lock nenhuma gravação entra na store antiga: as linhas acrescentadas durante a cópia
+        # passam para a nova (numa thread; as buscas seguem na antiga até a troca)
+        async with lock:
+            if self.vector_stores.get(index) is not store:
+                self._discard_directory(target)
+                return 0
+            tail = np.arange(snapshot, len(store))
+            if len(tail):
+                def append_tail():
+                    start = len(compacted)
+                    compacted.add(store.ids_at(tail), store.vectors_at(tail))
+                    if ann is not None:
+                        for position in range(start, len(compacted)):
+                            ann.add(position, compacted.vectors_at([position])[0])
+                
+                await self.executor.run_io(append_tail)
+            self._discard_directory(directory)
+            target.rename(directory)
+            reopened = VectorStore.open(directory, model=store.model)
+            self.vector_stores[index] = reopened
+            if ann is not None:
+                ann.get_vectors = reopened.vectors_at
+                self.ann_indices[index] = ann
+            dropped = snapshot - int(live.sum())
+            self.tombstones[index] -= dropped
+            PERSISTENCE_SECONDS.observe(time.perf_counter() - started, operation="vector_compaction")
+            if self.shards is not None:
+                await self.shards.broadcast("compact", index, ids[~live])
+            # O grafo novo pode mudar resultados aproximados: invalidar cache e cursores
+            self._bump_generation(index)
+        if ann is not None:
+            await self.executor.run_io(ann.save, directory)
+        
+        logger.info(f"Vetores do índice '{index}' compactados: {dropped} linhas descartadas, "
+                    f"{len(reopened)} mantidas em {time.perf_counter() - started:.2f}s")
+        return dropped
+    
+    async def _run_vector_compactor(self, interval: float, ratio: float):
+        """Compactar os índices cuja fração de tombstones passou de `ratio`"""
+        while True:
+            await asyncio.sleep(interval)
+            for index in list(self.indices):
+                store = self.vector_stores.get(index)
+                if store is None or not len(store) or self.tombstones.get(index, 0) < ratio * len(store):
+                    continue
+                try:
+                    await self.compact_vectors(index)
+                except Exception as e:
+                    # A store antiga continua válida; a próxima rodada tenta de novo
+                    logger.error(f"Erro ao compactar vetores do índice '{index}': {e}")
+    
+    def _discard_directory(self, directory: Optional[Path]):
+        """Mover um diretório para a lixeira (rename, O(1)) e apagá-lo em segundo plano"""
+        if directory is None or not directory.exists():
+            return
+        self.trash_dir.mkdir(parents=True, exist_ok=True)
+        target = self.trash_dir / f"{directory.name}-{time.time_ns()}"
+        directory.rename(target)
+        self._spawn(self.executor.run_io(shutil.rmtree, target, True))
+    
+    def _purge_leftovers(self):
+        """Apagar (em segundo plano) a lixeira e cópias de compactação interrompidas"""
+        leftovers = list(self.trash_dir.glob("*")) if self.trash_dir.exists() else []
+        leftovers += list((self.data_dir / "vectors").glob("*.compact"))
+        for path in leftovers:
+            self._spawn(self.executor.run_io(shutil.rmtree, path, True))
+    
+    def _spawn(self, awaitable):
+        """Tarefa em segundo plano (referenciada até terminar; o encerramento espera por ela)"""
+        task = asyncio.ensure_future(awaitable)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+    
+    async def delete_index(self, name: str):
+        """Deletar índice: sai da memória na hora; os arquivos de vetores vão para a lixeira
+        (apagados em segundo plano) e as linhas do SQLite saem na compactação do log"""
+        if name not in self.indices:
+            raise ValueError(f"Índice '{name}' não encontrado")
+        
+        await self._log({"op": "delete_index", "name": name})
+        if self.shards is not None:
+            await self.shards.broadcast("drop", name)
+        store = self.vector_stores.get(name)
+        if store is not None:
+            self._discard_directory(store.directory)
+        
+        # Remover da memória
+        del self.indices[name]
+        self.documents.pop(name, None)
+        self.vector_stores.pop(name, None)
+        self.ann_indices.pop(name, None)
+        self.lexical_indices.pop(name, None)
+        self.metadata_indices.pop(name, None)
+        self.ingest_locks.pop(name, None)
+        self.chunk_refs.pop(name, None)
+        self.shard_updates.pop(name, None)
+        self.collection_stats.pop(name, None)
+        self.tombstones.pop(name, None)
+        self.vectors_ready.discard(name)
+        self.generations.pop(name, None)
+        self.search_cache_stats.pop(name, None)
+    
+    async def shutdown(self):
+        """Gravar estado que não é persistido a cada escrita (grafos HNSW)"""
+        if self._startup is not None:
+            # Recarga ainda em andamento: terminar antes de gravar
+            await asyncio.gather(self._startup, return_exceptions=True)
+        for task in (self._model_loader, self._vector_compactor, self._loop_monitor):
+            if task is not None:
+                task.cancel()
+        if self._model_loader is not None:
+            await asyncio.gather(self._model_loader, return_exceptions=True)
+        self._model_loader = self._vector_compactor = self._loop_monitor = None
+        METRICS.unregister_collector(self._collect_metrics)
+        for name, ann in self.ann_indices.items():
+            store = self.vector_stores.get(name)
+            if store is not None and store.directory is not None:
+                await self.executor.run_io(ann.save, store.directory)
+        # Encerramento limpo: o log inteiro é aplicado ao SQLite
+        await self.wal.close(self._apply_wal)
+        if self.shards is not None:
+            self.shards.shutdown()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        self.executor.shutdown()
     
     async def get_indices(self):
         """Listar todos os índices"""
@@ -198,13 +1613,138 @@ class AgnoRAG:
         if index not in self.indices:
             raise ValueError(f"Índice '{index}' não encontrado")
         
+        store = self.vector_stores.get(index)
+        ann = self.ann_indices.get(index)
+        shards = await self.shards.broadcast("stats", index) if self.shards is not None else None
         return {
             **self.indices[index],
-            "documents": len(self.documents.get(index, {}))
+            "documents": len(self.documents.get(index, {})),
+            "chunks": sum(shard["chunks"] for shard in shards) if shards else len(self.lexical_indices[index]),
+            "vocabulary": (self.collection_stats[index] if shards else self.lexical_indices[index]).vocabulary_size(),
+            "vectors": len(store) if store is not None else 0,
+            "tombstones": self.tombstones.get(index, 0),
+            "vector_memory_bytes": store.memory_bytes() if store is not None else 0,
+            "vector_mapped_bytes": store.mapped_bytes() if store is not None else 0,
+            "vector_scored_bytes": store.scored_bytes() if store is not None else 0,
+            "quantization": store.quantization if store is not None else None,
+            "ann": {"type": "hnsw", "nodes": len(ann), **ann.params()} if ann is not None else None,
+            "embedding_batches": self.batcher.stats() if self.batcher is not None else None,
+            "embedding_cache": self.embedding_cache.stats() if self.embedding_cache is not None else None,
+            "generation": self.generations[index],
+            "search_cache": self.search_cache_stats[index],
+            "executor": self.executor.stats(),
+            "shards": {**self.shards.stats(), "partitions": shards} if shards else None,
+            "wal": self.wal.stats()
         }
+    
+    def _collect_metrics(self) -> Iterator[Family]:
+        """Amostras de /metrics lidas do estado atual (tamanhos por índice, caches, log, filas)"""
+        documents = Family("agno_index_documents", "gauge", "Documentos por índice")
+        chunks = Family("agno_index_chunks", "gauge", "Chunks vivos por índice")
+        vectors = Family("agno_index_vectors", "gauge", "Linhas no arquivo de vetores (inclui tombstones)")
+        tombstones = Family("agno_index_tombstones", "gauge", "Vetores de chunks removidos ainda não compactados")
+        memory = Family("agno_index_memory_bytes", "gauge", "Memória dos vetores por índice (resident: RAM; mapped: memmap)")
+        disk = Family("agno_index_disk_bytes", "gauge", "Arquivos de vetores e HNSW por índice em disco")
+        cache_hits = Family("agno_search_cache_hits_total", "counter", "Buscas respondidas pelo cache")
+        cache_misses = Family("agno_search_cache_misses_total", "counter", "Buscas que não estavam no cache")
+        for name in self.indices:
+            store = self.vector_stores.get(name)
+            documents.add(len(self.documents.get(name, {})), index=name)
+            chunks.add(self.collection_stats[name].count if self.shards is not None else len(self.lexical_indices[name]),
+                       index=name)
+            vectors.add(len(store) if store is not None else 0, index=name)
+            tombstones.add(self.tombstones.get(name, 0), index=name)
+            memory.add(store.memory_bytes() if store is not None else 0, index=name, kind="resident")
+            memory.add(store.mapped_bytes() if store is not None else 0, index=name, kind="mapped")
+            disk.add(directory_bytes(store.directory) if store is not None and store.directory is not None else 0,
+                     index=name)
+            cache_hits.add(self.search_cache_stats[name]["hits"], index=name)
+            cache_misses.add(self.search_cache_stats[name]["misses"], index=name)
+        yield from (documents, chunks, vectors, tombstones, memory, disk, cache_hits, cache_misses)
+        
+        storage = Family("agno_storage_disk_bytes", "gauge", "Arquivos de persistência em disco")
+        storage.add(sum(path.stat().st_size for path in self.data_dir.glob("agno.db*")), component="sqlite")
+        storage.add(directory_bytes(self.data_dir / "wal"), component="wal")
+        storage.add(sum(path.stat().st_size for path in self.data_dir.glob("embedding_cache.db*")),
+                    component="embedding_cache")
+        storage.add(directory_bytes(self.trash_dir), component="trash")
+        yield storage
+        
+        wal = self.wal.stats()
+        yield Family("agno_wal_records_total", "counter", "Registros gravados no log", [({}, wal["records"])])
+        yield Family("agno_wal_flushes_total", "counter", "fsyncs do log (um por grupo de commit)", [({}, wal["flushes"])])
+        yield Family("agno_wal_queued_records", "gauge", "Registros esperando o próximo commit", [({}, wal["queued"])])
+        
+        if self.embedding_cache is not None:
+            cache = self.embedding_cache.stats()
+            yield Family("agno_embedding_cache_hits_total", "counter", "Embeddings encontrados no cache",
+                         [({"tier": "memory"}, cache["memory_hits"]), ({"tier": "disk"}, cache["disk_hits"])])
+            yield Family("agno_embedding_cache_misses_total", "counter", "Embeddings calculados pelo modelo",
+                         [({}, cache["misses"])])
+        if self.batcher is not None:
+            yield Family("agno_embedding_queued_texts", "gauge", "Textos esperando o próximo lote de embeddings",
+                         [({}, self.batcher.stats()["queued"])])
+        yield Family("agno_embedding_model_state", "gauge", "Estado do modelo de embeddings (1 no estado atual)",
+                     [({"state": state}, 1 if state == self.model_state else 0)
+                      for state in ("pending", "loading", "indexing", "ready", "unavailable", "failed")])
+        yield Family("agno_executor_pending_tasks", "gauge", "Tarefas submetidas e não concluídas por pool",
+                     [({"pool": pool}, stats["pending"]) for pool, stats in self.executor.stats().items()])
+
+class BodyStreamingResponse(StreamingResponse):
+    """Resposta em streaming que lê o corpo da requisição enquanto responde"""
+    
+    def __init__(self, content, body_consumed: asyncio.Event, **kwargs):
+        super().__init__(content, **kwargs)
+        self.body_consumed = body_consumed
+    
+    async def listen_for_disconnect(self, receive):
+        # Só escutar desconexão depois de consumir o corpo; antes disso,
+        # receive() entregaria (e descartaria) as partes do corpo
+        await self.body_consumed.wait()
+        await super().listen_for_disconnect(receive)
+
+class RequestTimer:
+    """Middleware ASGI que marca a chegada da requisição em `request.state.received`:
+    a etapa parse do Server-Timing vai daí até o início do endpoint (leitura e validação do corpo)"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            scope.setdefault("state", {})["received"] = time.perf_counter()
+        await self.app(scope, receive, send)
 
-# Instância global do Agno
-agno = AgnoRAG()
+class StartupGate:
+    """Middleware ASGI que segura as requisições até os índices serem recarregados (health,
+    métricas e documentação respondem durante a inicialização); se ela falhar, responde 503"""
+    
+    OPEN_PATHS = ("/health", "/metrics", "/docs", "/redoc", "/openapi.json")
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not scope["path"].startswith(self.OPEN_PATHS):
+            try:
+                # `agno` é lido a cada requisição: a instância só existe depois do startup
+                await agno.wait_loaded()
+            except Exception:
+                response = JSONResponse({"detail": "Serviço indisponível: falha na inicialização"}, status_code=503)
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+def timed_response(content: Dict[str, Any], timings: Dict[str, float]) -> JSONResponse:
+    """Resposta JSON com o cabeçalho Server-Timing (etapas recebidas + serialize)"""
+    started = time.perf_counter()
+    response = JSONResponse(content)
+    response.headers["Server-Timing"] = server_timing({**timings, "serialize": elapsed_ms(started)})
+    return response
+
+# Instância global do Agno, criada no startup e não na importação: os processos filhos (pools e
+# shards usam spawn) reimportam este módulo como __mp_main__ e não devem abrir SQLite, log e pools
+agno: Optional[AgnoRAG] = None
 
 # Criar aplicação FastAPI
 app = FastAPI(
@@ -220,12 +1760,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(StartupGate)
+app.add_middleware(RequestTimer)
 
 @app.on_event("startup")
 async def startup_event():
-    """Inicializar serviços na inicialização"""
-    await agno.initialize()
+    """Inicializar serviços em segundo plano (o processo fica "live" antes de recarregar os índices)"""
+    global agno
+    agno = AgnoRAG()
+    agno.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Gravar estado pendente ao encerrar"""
+    await agno.shutdown()
+
+@app.get("/metrics")
+async def metrics():
+    """Métricas no formato texto do Prometheus"""
+    return Response(METRICS.render(), media_type=CONTENT_TYPE)
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
@@ -236,11 +1791,26 @@ async def health_check():
         timestamp=datetime.now().isoformat(),
         services={
             "agno_rag": "running",
-            "embeddings": "loaded" if agno.embeddings_model else "not_loaded",
+            "embeddings": {"ready": "loaded", "loading": "loading", "indexing": "loading"}.get(agno.model_state, "not_loaded"),
             "indices": str(len(agno.indices))
         }
     )
 
+@app.get("/health/live")
+async def health_live():
+    """Liveness: o processo responde (não depende dos índices nem do modelo)"""
+    return {"status": "live"}
+
+@app.get("/health/ready")
+async def health_ready(require_model: bool = False):
+    """Readiness: índices recarregados (busca lexical disponível). Com require_model=true, só depois
+    que o modelo de embeddings terminar de carregar (ou o serviço seguir em modo básico sem ele)"""
+    readiness = agno.readiness()
+    ready = readiness["indices"] == "loaded" and not (
+        require_model and readiness["model"] in ("pending", "loading", "indexing")
+    )
+    return JSONResponse({"status": "ready" if ready else "starting", **readiness}, status_code=200 if ready else 503)
+
 @app.post("/indices")
 async def create_index(request: IndexRequest):
     """Criar novo índice"""
@@ -278,68 +1848,192 @@ async def get_index_stats(index_name: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/documents")
-async def add_document(request: DocumentRequest):
-    """Adicionar documento ao índice"""
+async def add_document(request: DocumentRequest, http_request: Request):
+    """Adicionar documento ao índice (etapas no cabeçalho Server-Timing)"""
     try:
+        timings = {"parse": elapsed_ms(http_request.state.received)}
         document = await agno.add_document(
             index=request.index,
             document_id=request.document_id,
             content=request.content,
-            metadata=request.metadata
+            metadata=request.metadata,
+            timings=timings
         )
-        return {"success": True, "document": document}
+        return timed_response({"success": True, "document": document}, timings)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         logger.error(f"Erro ao adicionar documento: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/documents/batch")
+async def add_documents_batch(request: Request):
+    """Adicionar documentos em lote a partir de um corpo NDJSON (um DocumentRequest por linha)"""
+    
+    body_consumed = asyncio.Event()
+    
+    async def process():
+        pending = []
+        line_number = 0
+        ok = errors = 0
+        buffer = b""
+        
+        async def commit():
+            nonlocal ok, errors
+            # Agrupar por índice: cada grupo é uma transação e um lote de embeddings
+            groups = {}
+            for number, record in pending:
+                groups.setdefault(record.index, []).append((number, record))
+            pending.clear()
+            
+            statuses = []
+            for index, records in groups.items():
+                try:
+                    documents = await agno.add_documents(index, [record.model_dump() for _, record in records])
+                    for (number, record), document in zip(records, documents):
+                        statuses.append({"line": number, "document_id": record.document_id,
+                                         "status": "ok", "chunks": len(document)})
+                    ok += len(records)
+                except Exception as e:
+                    logger.error(f"Erro ao adicionar lote no índice '{index}': {e}")
+                    for number, record in records:
+                        statuses.append({"line": number, "document_id": record.document_id,
+                                         "status": "error", "error": str(e)})
+                    errors += len(records)
+            
+            statuses.sort(key=lambda status: status["line"])
+            return "".join(json.dumps(status, ensure_ascii=False) + "\n" for status in statuses)
+        
+        def parse(line: bytes):
+            nonlocal errors
+            try:
+                pending.append((line_number, DocumentRequest.model_validate_json(line)))
+                return ""
+            except Exception as e:
+                errors += 1
+                return json.dumps({"line": line_number, "status": "error", "error": str(e)}, ensure_ascii=False) + "\n"
+        
+        try:
+            async for piece in request.stream():
+                buffer += piece
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    line_number += 1
+                    if line.strip():
+                        output = parse(line)
+                        if output:
+                            yield output
+                    if len(pending) >= BATCH_COMMIT_SIZE:
+                        yield await commit()
+        finally:
+            body_consumed.set()
+        
+        if buffer.strip():
+            line_number += 1
+            output = parse(buffer)
+            if output:
+                yield output
+        if pending:
+            yield await commit()
+        
+        logger.info(f"Lote NDJSON processado: {ok} documentos adicionados, {errors} erros")
+        yield json.dumps({"done": True, "ok": ok, "errors": errors}) + "\n"
+    
+    return BodyStreamingResponse(process(), body_consumed=body_consumed, media_type="application/x-ndjson")
+
 @app.post("/search")
-async def search_documents(request: SearchRequest):
-    """Buscar documentos no índice"""
+async def search_documents(request: SearchRequest, http_request: Request):
+    """Buscar documentos no índice (etapas no cabeçalho Server-Timing).
+    Com `stream: true` a resposta é NDJSON: um resultado por linha, à medida que são montados,
+    e uma última linha {"done": true, "next_cursor": ...}.
+    Com `explain: true` cada resultado traz a decomposição do score e a resposta, em `explain`,
+    os candidatos examinados."""
     try:
-        results = await agno.search(
+        parse = elapsed_ms(http_request.state.received)
+        timings = {}
+        page = {}
+        results = await agno.search_stream(
             index=request.index,
             query=request.query,
             limit=request.limit,
-            include_metadata=request.include_metadata
+            include_metadata=request.include_metadata,
+            mode=request.mode,
+            weights=request.weights,
+            rrf_k=request.rrf_k,
+            filters=request.filters,
+            cursor=request.cursor,
+            explain=request.explain,
+            timings=timings,
+            page=page
         )
-        return {"success": True, "results": results}
+        mode = agno.search_mode(request.mode)
+        if request.stream:
+            async def lines():
+                for result in results:
+                    yield json.dumps(result, ensure_ascii=False) + "\n"
+                done = {"done": True, "next_cursor": page.get("next_cursor"), "mode": mode, "timings": timings}
+                if request.explain:
+                    done["explain"] = page.get("explain")
+                yield json.dumps(done) + "\n"
+            
+            # Os cabeçalhos saem antes dos resultados: só as etapas já medidas (sem collect/serialize)
+            return StreamingResponse(lines(), media_type="application/x-ndjson",
+                                     headers={"Server-Timing": server_timing({"parse": parse, **timings})})
+        results = list(results)
+        response = {"success": True, "results": results, "next_cursor": page.get("next_cursor"), "mode": mode,
+                    "timings": timings}
+        if request.explain:
+            response["explain"] = page.get("explain")
+        return timed_response(response, {"parse": parse, **timings})
+    except ExpiredCursor as e:
+        # Cursor de outra geração do índice: o cliente deve recomeçar da primeira página
+        raise HTTPException(status_code=410, detail=str(e))
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         logger.error(f"Erro na busca: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/search/batch")
+async def search_documents_batch(request: SearchBatchRequest, http_request: Request):
+    """Várias buscas numa única requisição; `results` traz um item por busca, na mesma ordem"""
+    try:
+        parse = elapsed_ms(http_request.state.received)
+        timings = {}
+        outcomes = await agno.search_batch([search.model_dump(exclude={"stream"}) for search in request.searches],
+                                          timings=timings)
+        return timed_response({"success": True, "results": outcomes, "timings": timings}, {"parse": parse, **timings})
+    except Exception as e:
+        logger.error(f"Erro na busca em lote: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.delete("/indices/{index_name}")
 async def delete_index(index_name: str):
     """Deletar índice"""
     try:
-        if index_name not in agno.indices:
-            raise HTTPException(status_code=404, detail=f"Índice '{index_name}' não encontrado")
-        
-        # Remover arquivos
-        import os
-        index_file = agno.data_dir / f"{index_name}_index.json"
-        if index_file.exists():
-            os.remove(index_file)
-        
-        # Remover documentos
-        for doc_id in agno.documents.get(index_name, {}):
-            doc_file = agno.data_dir / f"{index_name}_{doc_id}.json"
-            if doc_file.exists():
-                os.remove(doc_file)
-        
-        # Remover da memória
-        del agno.indices[index_name]
-        if index_name in agno.documents:
-            del agno.documents[index_name]
+        await agno.delete_index(index_name)
         
         return {"success": True, "message": f"Índice '{index_name}' deletado com sucesso"}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         logger.error(f"Erro ao deletar índice: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.delete("/indices/{index_name}/documents/{document_id}")
+async def delete_document(index_name: str, document_id: str):
+    """Remover um documento do índice"""
+    try:
+        await agno.delete_document(index_name, document_id)
+        return {"success": True, "message": f"Documento '{document_id}' removido do índice '{index_name}'"}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Erro ao remover documento: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 if __name__ == "__main__":
     # Configurações do servidor
     host = os.getenv("AGNO_HOST", "0.0.0.0")
@@ -0,0 +1,295 @@
+"""
+Shards de busca do Agno RAG em processos separados
+Cada índice é particionado por hash do id do documento entre N processos; cada shard guarda
+as postings BM25 e os vetores dos seus chunks (e o grafo HNSW, se o índice usar ANN).
+O coordenador (processo do FastAPI) mantém documentos, filtros, persistência e as estatísticas
+globais do BM25, envia as alterações em lote para cada shard e, na busca, consulta todos em
+paralelo e junta os top-k (os scores são os mesmos de um índice único).
+"""
+
+import asyncio
+import hashlib
+import heapq
+import logging
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Any, Collection, Dict, List, Optional, Sequence, Tuple
+
+from lexical_index import InvertedIndex
+
+try:
+    import numpy as np
+    from vector_store import VectorStore
+    from hnsw import HNSWIndex
+except ImportError:
+    # numpy não instalado: shards só com busca lexical
+    np = None
+    VectorStore = None
+    HNSWIndex = None
+
+logger = logging.getLogger(__name__)
+
+# Linhas de vetores por mensagem ao popular os shards na inicialização
+SEED_BATCH_ROWS = 65536
+
+Change = Tuple[bool, int, str, Optional[Dict[str, int]]]  # (inclusão?, chunk_id, texto, termos)
+
+
+def shard_of(document_id: str, count: int) -> int:
+    """Shard de um documento (hash estável entre processos e reinícios, ao contrário de hash())"""
+    digest = hashlib.blake2b(document_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % count
+
+
+def merge_hits(parts: Sequence[List[Tuple[int, float]]], k: int) -> List[Tuple[int, float]]:
+    """Juntar os top-k de cada shard num único top-k global"""
+    return heapq.nlargest(k, chain.from_iterable(parts), key=lambda hit: hit[1])
+
+
+class ShardIndex:
+    """Partição de um índice dentro de um processo de shard"""
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.settings = settings or {}
+        self.lexical = InvertedIndex()
+        self.vectors = None
+        self.ann = None
+
+    def _ann_params(self) -> Optional[Dict[str, int]]:
+        if HNSWIndex is None or self.settings.get("ann") != "hnsw":
+            return None
+        return {
+            "M": int(self.settings.get("hnsw_m", 16)),
+            "ef_construction": int(self.settings.get("hnsw_ef_construction", 100)),
+            "ef_search": int(self.settings.get("hnsw_ef_search", 64))
+        }
+
+    def update(self, changes: List[Change], vector_ids: Optional[List[int]], vectors):
+        for added, chunk_id, text, terms in changes:
+            if added:
+                self.lexical.add(chunk_id, text, terms)
+            else:
+                self.lexical.remove(chunk_id, text)
+        if vector_ids:
+            self.add_vectors(vector_ids, vectors)
+
+    def add_vectors(self, ids: List[int], vectors):
+        if self.vectors is None:
+            # Em memória (sem diretório): a persistência fica com o coordenador
+            self.vectors = VectorStore(
+                dim=vectors.shape[1],
+                quantization=self.settings.get("quantization"),
+                rescore_factor=int(self.settings.get("rescore_factor", 4))
+            )
+            params = self._ann_params()
+            if params is not None:
+                self.ann = HNSWIndex(self.vectors.vectors_at, **params)
+        start = len(self.vectors)
+        self.vectors.add(ids, vectors)
+        if self.ann is not None:
+            for position in range(start, len(self.vectors)):
+                self.ann.add(position, self.vectors.vectors_at([position])[0])
+
+    def compact(self, dead_ids) -> int:
+        """Descartar os vetores de chunks removidos e recriar o grafo HNSW; retorna as linhas descartadas"""
+        store = self.vectors
+        if store is None or len(dead_ids) == 0:
+            return 0
+        keep = np.flatnonzero(~np.isin(store.ids(), dead_ids))
+        if len(keep) == len(store):
+            return 0
+        self.vectors = store.compacted(keep)
+        if self.ann is not None:
+            self.ann = HNSWIndex(self.vectors.vectors_at, **self._ann_params())
+            for position in range(len(self.vectors)):
+                self.ann.add(position, self.vectors.vectors_at([position])[0])
+        return len(store) - len(keep)
+
+    def lexical_search(self, query: str, k: int, candidates: Optional[Collection[int]],
+                       collection: Optional[Tuple[int, int, Dict[str, int]]] = None):
+        return self.lexical.search(query, k, candidates, collection)
+
+    def vector_search(self, query_vector, k: int, candidates: Optional[Collection[int]]):
+        store = self.vectors
+        if store is None or len(store) == 0:
+            return []
+        k = min(len(store), k)
+        if candidates is not None:
+            ids, scores = store.search(query_vector, k, np.fromiter(candidates, dtype=np.int64))
+        elif self.ann is not None:
+            positions, scores = self.ann.search(query_vector / (np.linalg.norm(query_vector) or 1.0), k)
+            ids = store.ids_at(positions)
+        else:
+            ids, scores = store.search(query_vector, k)
+        return list(zip(ids.tolist(), scores.tolist()))
+
+    def vector_search_many(self, query_vectors, k: int):
+        """Várias consultas sem filtro: um produto matriz-matriz (ou o grafo HNSW, consulta a consulta)"""
+        store = self.vectors
+        if store is None or len(store) == 0:
+            return [[] for _ in query_vectors]
+        if self.ann is not None:
+            return [self.vector_search(query_vector, k, None) for query_vector in query_vectors]
+        return [list(zip(ids.tolist(), scores.tolist())) for ids, scores in store.search_many(query_vectors, k)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chunks": len(self.lexical),
+            "vocabulary": self.lexical.vocabulary_size(),
+            "vectors": len(self.vectors) if self.vectors is not None else 0,
+            "ann_nodes": len(self.ann) if self.ann is not None else None,
+        }
+
+
+def serve(connection):
+    """Loop de um processo de shard: uma mensagem por vez, na ordem de chegada"""
+    indices: Dict[str, ShardIndex] = {}
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            return
+        operation, *args = message
+        if operation == "stop":
+            connection.send(("ok", None))
+            return
+        try:
+            if operation == "create":
+                name, settings = args
+                indices[name] = ShardIndex(settings)
+                result = None
+            elif operation == "drop":
+                indices.pop(args[0], None)
+                result = None
+            elif operation == "update":
+                name, *update = args
+                indices[name].update(*update)
+                result = None
+            elif operation == "compact":
+                name, dead_ids = args
+                result = indices[name].compact(dead_ids)
+            elif operation == "lexical":
+                name, query, k, candidates, *extra = args
+                result = indices[name].lexical_search(query, k, candidates, *extra)
+            elif operation == "matching":
+                name, query, candidates = args
+                result = indices[name].lexical.matching(query, candidates)
+            elif operation == "vector":
+                name, query_vector, k, candidates = args
+                result = indices[name].vector_search(query_vector, k, candidates)
+            elif operation == "vector_many":
+                name, query_vectors, k = args
+                result = indices[name].vector_search_many(query_vectors, k)
+            elif operation == "stats":
+                result = indices[args[0]].stats()
+            else:
+                raise ValueError(f"Operação desconhecida: {operation}")
+            connection.send(("ok", result))
+        except Exception as e:
+            connection.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class ShardUpdates:
+    """Alterações de um índice ainda não enviadas, agrupadas por shard"""
+
+    def __init__(self, count: int):
+        self.count = count
+        self.clear()
+
+    def clear(self):
+        # Inclusões e remoções numa única lista, na ordem em que aconteceram
+        self.changes: List[List[Change]] = [[] for _ in range(self.count)]
+        self.vector_ids: List[List[int]] = [[] for _ in range(self.count)]
+        self.vectors: List[list] = [[] for _ in range(self.count)]
+
+    def add_chunk(self, document_id: str, chunk_id: int, text: str, terms: Optional[Dict[str, int]] = None):
+        self.changes[shard_of(document_id, self.count)].append((True, chunk_id, text, terms))
+
+    def remove_chunk(self, document_id: str, chunk_id: int, text: str):
+        self.changes[shard_of(document_id, self.count)].append((False, chunk_id, text, None))
+
+    def add_vectors(self, document_ids: Sequence[str], ids: Sequence[int], vectors):
+        """Vetores de chunks (um id de documento por linha)"""
+        rows: List[List[int]] = [[] for _ in range(self.count)]
+        for row, document_id in enumerate(document_ids):
+            rows[shard_of(document_id, self.count)].append(row)
+        for shard, selected in enumerate(rows):
+            if selected:
+                self.vector_ids[shard].extend(ids[row] for row in selected)
+                self.vectors[shard].append(vectors[selected])
+
+    def take(self, index: str) -> List[Optional[tuple]]:
+        """Mensagens "update" por shard (None se o shard não tem alterações) e esvaziar o buffer"""
+        messages = []
+        for shard in range(self.count):
+            if not (self.changes[shard] or self.vector_ids[shard]):
+                messages.append(None)
+                continue
+            vectors = np.concatenate(self.vectors[shard]) if self.vector_ids[shard] else None
+            messages.append(("update", index, self.changes[shard], self.vector_ids[shard], vectors))
+        self.clear()
+        return messages
+
+
+class ShardPool:
+    """Processos de shard, cada um com uma thread que envia mensagens e espera as respostas"""
+
+    def __init__(self, count: int):
+        self.count = count
+        context = multiprocessing.get_context("spawn")
+        self.connections = []
+        self.processes = []
+        self.channels = []
+        for shard in range(count):
+            parent, child = context.Pipe()
+            process = context.Process(target=serve, args=(child,), name=f"agno-shard-{shard}", daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+            # Um canal por shard: mensagens (escritas e buscas) chegam na ordem em que foram enviadas
+            self.channels.append(ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"agno-shard-{shard}"))
+        self.requests = [0] * count
+        logger.info(f"{count} shards de busca iniciados")
+
+    def _call(self, shard: int, message: tuple) -> Any:
+        connection = self.connections[shard]
+        connection.send(message)
+        status, result = connection.recv()
+        if status == "error":
+            raise RuntimeError(f"Shard {shard}: {result}")
+        return result
+
+    def submit(self, shard: int, message: tuple) -> asyncio.Future:
+        """Enfileirar uma mensagem no canal do shard (a ordem é a da submissão)"""
+        self.requests[shard] += 1
+        return asyncio.get_running_loop().run_in_executor(self.channels[shard], self._call, shard, message)
+
+    async def broadcast(self, *message) -> List[Any]:
+        """Mesma mensagem para todos os shards, em paralelo"""
+        return await asyncio.gather(*(self.submit(shard, message) for shard in range(self.count)))
+
+    async def scatter(self, messages: Sequence[Optional[tuple]]) -> List[Any]:
+        """Uma mensagem por shard (None = nada a enviar para aquele shard), em paralelo"""
+        futures = [self.submit(shard, message) for shard, message in enumerate(messages) if message is not None]
+        return await asyncio.gather(*futures)
+
+    def shutdown(self):
+        for shard, process in enumerate(self.processes):
+            try:
+                self.channels[shard].submit(self._call, shard, ("stop",)).result(timeout=5)
+            except Exception as e:
+                logger.warning(f"Shard {shard} não respondeu ao encerramento: {e}")
+            self.channels[shard].shutdown(wait=True)
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+            self.connections[shard].close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "shards": self.count,
+            "alive": sum(process.is_alive() for process in self.processes),
+            "requests": self.requests,
+        }
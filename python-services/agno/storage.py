@@ -0,0 +1,222 @@
+"""
+Armazenamento persistente do Agno RAG em SQLite (modo WAL)
+Um único banco por diretório de dados, com tabelas de índices, documentos e chunks
+"""
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+from documents import StoredDocument
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS indices (
+    name TEXT PRIMARY KEY,
+    description TEXT NOT NULL DEFAULT '',
+    settings TEXT NOT NULL DEFAULT '{}',
+    created_at TEXT NOT NULL,
+    document_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS documents (
+    index_name TEXT NOT NULL,
+    document_id TEXT NOT NULL,
+    content TEXT NOT NULL,
+    metadata TEXT NOT NULL DEFAULT '{}',
+    added_at TEXT NOT NULL,
+    embedding_model TEXT,
+    first_chunk_id INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (index_name, document_id)
+);
+
+CREATE TABLE IF NOT EXISTS chunks (
+    index_name TEXT NOT NULL,
+    document_id TEXT NOT NULL,
+    ordinal INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    "end" INTEGER NOT NULL,
+    chunk_id INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (index_name, document_id, ordinal)
+);
+"""
+
+
+class DocumentStore:
+    """Persistência de índices, documentos e offsets de chunks"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self._lock = threading.Lock()
+
+    def _migrate(self):
+        """Adicionar colunas criadas depois da primeira versão do esquema"""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(documents)")}
+        if "first_chunk_id" not in columns:
+            with self.conn:
+                self.conn.execute("ALTER TABLE documents ADD COLUMN first_chunk_id INTEGER NOT NULL DEFAULT 0")
+
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(chunks)")}
+        if "chunk_id" not in columns:
+            # Antes os ids eram contíguos por documento: primeiro id + ordinal
+            with self.conn:
+                self.conn.execute("ALTER TABLE chunks ADD COLUMN chunk_id INTEGER NOT NULL DEFAULT 0")
+                self.conn.execute(
+                    "UPDATE chunks SET chunk_id = ordinal + COALESCE((SELECT first_chunk_id FROM documents d "
+                    "WHERE d.index_name = chunks.index_name AND d.document_id = chunks.document_id), 0)"
+                )
+
+    def close(self):
+        self.conn.close()
+
+    def save_index(self, index_data: Dict[str, Any]):
+        """Criar (ou recriar, sem documentos) um índice"""
+        with self._lock, self.conn:
+            self._save_index(index_data)
+
+    def save_document(self, index: str, document: StoredDocument, document_count: int):
+        """Gravar documento, offsets e ids dos seus chunks numa única transação"""
+        self.save_documents(index, [document], document_count)
+
+    def save_documents(self, index: str, documents: List[StoredDocument], document_count: int):
+        """Gravar vários documentos (com offsets e ids dos chunks) numa única transação"""
+        with self._lock, self.conn:
+            self._save_documents(index, documents, document_count)
+
+    def delete_index(self, name: str):
+        """Remover índice, documentos e chunks"""
+        with self._lock, self.conn:
+            self._delete_index(name)
+
+    def apply_records(self, records: List[Dict[str, Any]]):
+        """Aplicar registros do log de escrita, na ordem, numa única transação"""
+        with self._lock, self.conn:
+            for record in records:
+                operation = record["op"]
+                if operation == "create_index":
+                    self._save_index(record["index"])
+                elif operation == "save_documents":
+                    self._save_documents(
+                        record["index"],
+                        [StoredDocument.from_record(document) for document in record["documents"]],
+                        record["document_count"]
+                    )
+                elif operation == "delete_documents":
+                    self._delete_documents(record["index"], record["document_ids"], record["document_count"])
+                elif operation == "delete_index":
+                    self._delete_index(record["name"])
+                else:
+                    raise ValueError(f"Operação desconhecida no log: {operation}")
+
+    def _save_index(self, index_data: Dict[str, Any]):
+        self.conn.execute("DELETE FROM chunks WHERE index_name = ?", (index_data["name"],))
+        self.conn.execute("DELETE FROM documents WHERE index_name = ?", (index_data["name"],))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO indices (name, description, settings, created_at, document_count) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                index_data["name"],
+                index_data["description"],
+                json.dumps(index_data["settings"], ensure_ascii=False),
+                index_data["created_at"],
+                index_data["document_count"],
+            ),
+        )
+
+    def _save_documents(self, index: str, documents: List[StoredDocument], document_count: int):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO documents "
+            "(index_name, document_id, content, metadata, added_at, embedding_model, first_chunk_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    index,
+                    document.id,
+                    document.content,
+                    json.dumps(document.metadata, ensure_ascii=False),
+                    document.added_at,
+                    document.embedding_model,
+                    document.chunk_ids[0] if document.chunk_ids else 0,
+                )
+                for document in documents
+            ],
+        )
+        self.conn.executemany(
+            "DELETE FROM chunks WHERE index_name = ? AND document_id = ?",
+            [(index, document.id) for document in documents],
+        )
+        self.conn.executemany(
+            'INSERT INTO chunks (index_name, document_id, ordinal, start, "end", chunk_id) VALUES (?, ?, ?, ?, ?, ?)',
+            [
+                (index, document.id, ordinal, start, end, chunk_id)
+                for document in documents
+                for ordinal, ((start, end), chunk_id) in enumerate(zip(document.spans, document.chunk_ids))
+            ],
+        )
+        self.conn.execute(
+            "UPDATE indices SET document_count = ? WHERE name = ?",
+            (document_count, index),
+        )
+
+    def _delete_documents(self, index: str, document_ids: List[str], document_count: int):
+        self.conn.executemany(
+            "DELETE FROM chunks WHERE index_name = ? AND document_id = ?",
+            [(index, document_id) for document_id in document_ids],
+        )
+        self.conn.executemany(
+            "DELETE FROM documents WHERE index_name = ? AND document_id = ?",
+            [(index, document_id) for document_id in document_ids],
+        )
+        self.conn.execute(
+            "UPDATE indices SET document_count = ? WHERE name = ?",
+            (document_count, index),
+        )
+
+    def _delete_index(self, name: str):
+        self.conn.execute("DELETE FROM chunks WHERE index_name = ?", (name,))
+        self.conn.execute("DELETE FROM documents WHERE index_name = ?", (name,))
+        self.conn.execute("DELETE FROM indices WHERE name = ?", (name,))
+
+    def load_indices(self) -> List[Dict[str, Any]]:
+        """Ler todos os índices"""
+        rows = self.conn.execute(
+            "SELECT name, description, settings, created_at, document_count FROM indices ORDER BY created_at"
+        ).fetchall()
+        return [
+            {
+                "name": name,
+                "description": description,
+                "settings": json.loads(settings),
+                "created_at": created_at,
+                "document_count": document_count,
+            }
+            for name, description, settings, created_at, document_count in rows
+        ]
+
+    def load_documents(self, index: str) -> Iterator[StoredDocument]:
+        """Iterar os documentos de um índice, com offsets e ids dos chunks"""
+        spans: Dict[str, List[Tuple[int, int]]] = {}
+        chunk_ids: Dict[str, List[int]] = {}
+        for document_id, start, end, chunk_id in self.conn.execute(
+            'SELECT document_id, start, "end", chunk_id FROM chunks WHERE index_name = ? ORDER BY document_id, ordinal',
+            (index,),
+        ):
+            spans.setdefault(document_id, []).append((start, end))
+            chunk_ids.setdefault(document_id, []).append(chunk_id)
+
+        cursor = self.conn.execute(
+            "SELECT document_id, content, metadata, added_at, embedding_model "
+            "FROM documents WHERE index_name = ? ORDER BY first_chunk_id, added_at",
+            (index,),
+        )
+        for document_id, content, metadata, added_at, embedding_model in cursor:
+            document = StoredDocument(document_id, content, json.loads(metadata), added_at, embedding_model,
+                                      spans.pop(document_id, ()))
+            document.chunk_ids.extend(chunk_ids.pop(document_id, ()))
+            yield document
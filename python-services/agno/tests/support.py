@@ -0,0 +1,64 @@
+"""
+Apoio aos testes do serviço Agno: uma instância real de AgnoRAG num diretório temporário, com um
+codificador determinístico (hash das palavras) no lugar do modelo do sentence-transformers
+"""
+
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class HashEncoder:
+    """Codificador de teste: conta as palavras do texto em 64 dimensões (mesmas palavras, mesmo vetor)"""
+
+    dimension = 64
+
+    def __init__(self, model_name: str = "", device: str = "cpu"):
+        self.model_name = model_name
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False, **kwargs):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dimension] += 1
+        return vectors
+
+
+@unittest.skipIf(np is None, "numpy não disponível")
+class AgnoTestCase(unittest.IsolatedAsyncioTestCase):
+    """AgnoRAG inicializado (modelo pronto) num diretório de dados próprio; encerrado ao fim de cada teste"""
+
+    async def asyncSetUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cwd = os.getcwd()
+        os.chdir(directory.name)
+        self.addCleanup(os.chdir, cwd)
+        patcher = mock.patch.object(main, "load_encoder", HashEncoder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.rag = main.AgnoRAG()
+        await self.rag.initialize()
+        await self.rag.wait_model()
+        self.assertEqual(self.rag.model_state, "ready")
+
+    async def asyncTearDown(self):
+        await self.rag.shutdown()
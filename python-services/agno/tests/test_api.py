@@ -0,0 +1,20 @@
+import httpx
+
+from support import AgnoTestCase, main
+
+
+class IndexEndpointsTest(AgnoTestCase):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        agno = main.agno
+        main.agno = self.rag
+        self.addCleanup(setattr, main, "agno", agno)
+        # Mesmo event loop da instância; sem lifespan (o startup criaria outra instância)
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://agno")
+        self.addAsyncCleanup(self.client.aclose)
+
+    async def test_delete_missing_index_is_404(self):
+        response = await self.client.delete("/indices/nenhum")
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("nenhum", response.json()["detail"])
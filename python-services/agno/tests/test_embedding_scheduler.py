@@ -0,0 +1,34 @@
+import asyncio
+import time
+import unittest
+
+from support import np
+
+if np is not None:
+    from embedding_scheduler import EmbeddingBatcher
+
+
+@unittest.skipIf(np is None, "numpy não disponível")
+class EmbeddingBatcherTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.batcher = EmbeddingBatcher(
+            lambda texts: np.ones((len(texts), 4), dtype=np.float32), max_batch_size=64, max_wait_ms=500
+        )
+        self.addCleanup(self.batcher.executor.shutdown)
+
+    async def asyncTearDown(self):
+        self.batcher._worker.cancel()
+
+    async def test_single_request_does_not_wait(self):
+        started = time.perf_counter()
+        for _ in range(3):
+            vectors = await self.batcher.encode(["texto"])
+        self.assertEqual(vectors.shape, (1, 4))
+        self.assertLess(time.perf_counter() - started, 0.25)
+
+    async def test_concurrent_requests_share_batches(self):
+        results = await asyncio.gather(*(self.batcher.encode([f"texto {i}", "outro"]) for i in range(8)))
+        self.assertTrue(all(vectors.shape == (2, 4) for vectors in results))
+        self.assertEqual(self.batcher.stats()["texts"], 16)
+        self.assertLessEqual(self.batcher.stats()["batches"], 2)
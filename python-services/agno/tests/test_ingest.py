@@ -0,0 +1,41 @@
+import asyncio
+
+from support import AgnoTestCase, HashEncoder
+
+
+class RecreateIndexTest(AgnoTestCase):
+
+    async def test_recreated_index_drops_vectors_in_flight(self):
+        # Os embeddings de "x" ficam presos até o índice ser recriado e receber "y"; os ids de chunk
+        # recomeçam no índice novo, então o vetor de "x" cairia sobre o chunk de "y"
+        await self.rag.create_index("a")
+        embed = self.rag._embed
+        embedding = asyncio.Event()
+        release = asyncio.Event()
+
+        async def gated(texts):
+            self.rag._embed = embed
+            embedding.set()
+            await release.wait()
+            return await embed(texts)
+
+        self.rag._embed = gated
+        stale = asyncio.create_task(self.rag.add_documents("a", [
+            {"document_id": "x", "content": "receitas de bolo de cenoura"}
+        ]))
+        await embedding.wait()
+        await self.rag.create_index("a")
+        await self.rag.add_documents("a", [{"document_id": "y", "content": "numpy arrays e álgebra linear"}])
+        release.set()
+        await stale
+
+        store = self.rag.vector_stores["a"]
+        chunk_ids = self.rag.documents["a"]["y"].chunk_ids
+        self.assertEqual(sorted(store.ids().tolist()), sorted(chunk_ids))
+        expected = HashEncoder().encode(["numpy arrays e álgebra linear"])[0]
+        expected /= (expected ** 2).sum() ** 0.5
+        stored = store.vectors_at([0])[0]
+        self.assertAlmostEqual(float(stored @ expected), 1.0, places=3)
+
+        results = await self.rag.search("a", "numpy", mode="vector")
+        self.assertEqual([result["document_id"] for result in results], ["y"])
@@ -0,0 +1,25 @@
+from support import AgnoTestCase
+
+
+class SearchBatchTest(AgnoTestCase):
+
+    async def test_same_query_on_index_without_vectors(self):
+        # "a" tem vetores; "b" existe mas está vazio (sem VectorStore). A mesma consulta nos dois
+        # é embutida uma vez só, mas o vetor não pode levar "b" para a busca vetorial em grupo
+        await self.rag.create_index("a")
+        await self.rag.create_index("b")
+        await self.rag.add_documents("a", [
+            {"document_id": "d1", "content": "numpy arrays e álgebra linear"},
+            {"document_id": "d2", "content": "receitas de bolo de cenoura"}
+        ])
+
+        outcomes = await self.rag.search_batch([
+            {"index": "a", "query": "numpy", "mode": "vector"},
+            {"index": "b", "query": "numpy", "mode": "vector"},
+            {"index": "b", "query": "numpy", "mode": "hybrid"}
+        ])
+
+        self.assertTrue(all(outcome["success"] for outcome in outcomes))
+        self.assertEqual(outcomes[0]["results"][0]["document_id"], "d1")
+        self.assertEqual(outcomes[1]["results"], [])
+        self.assertEqual(outcomes[2]["results"], [])
@@ -0,0 +1,54 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from support import np
+
+if np is not None:
+    from vector_store import VectorStore, normalize_rows
+
+
+@unittest.skipIf(np is None, "numpy não disponível")
+class FilteredSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.vectors = rng.standard_normal((3000, 16)).astype(np.float32)
+        self.ids = np.arange(3000, dtype=np.int64) * 3
+        self.query = rng.standard_normal(16).astype(np.float32)
+        self.candidates = np.concatenate([self.ids[rng.choice(3000, 200, replace=False)], [1, 10 ** 7, -5]])
+
+    def expected(self, k):
+        kept = np.isin(self.ids, self.candidates)
+        scores = normalize_rows(self.vectors[kept]) @ (self.query / np.linalg.norm(self.query))
+        order = np.argsort(-scores)[:k]
+        return self.ids[kept][order]
+
+    def assertSameTop(self, store, k=10):
+        ids, scores = store.search(self.query, k, self.candidates)
+        self.assertEqual(ids.tolist(), self.expected(k).tolist())
+        self.assertTrue(np.all(np.diff(scores) <= 0))
+
+    def test_memory_and_reopened_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = VectorStore(16, directory=Path(directory))
+            store.add(self.ids[:2000], self.vectors[:2000])
+            store.add(self.ids[2000:], self.vectors[2000:])
+            self.assertSameTop(store)
+            self.assertSameTop(store, k=500)
+
+            reopened = VectorStore.open(Path(directory))
+            reopened.add([999999], self.vectors[:1])
+            self.assertSameTop(reopened)
+
+    def test_latest_row_wins_and_quantized(self):
+        store = VectorStore(16, quantization="int8")
+        store.add(self.ids, self.vectors)
+        self.assertSameTop(store)
+
+        # Linha obsoleta do primeiro candidato: só a mais nova é pontuada
+        stale = int(self.candidates[0])
+        store.add([stale], -self.vectors[self.ids == stale])
+        ids, _ = store.search(self.query, 1000, self.candidates)
+        self.assertEqual(ids.tolist().count(stale), 1)
+        self.assertEqual(store.search(self.query, 5, np.array([], dtype=np.int64))[0].tolist(), [])
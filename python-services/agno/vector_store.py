@@ -0,0 +1,409 @@
+"""
+Armazenamento vetorial do Agno RAG
+Matriz contígua de embeddings de chunks, consultada com um único produto matriz-vetor
+
+Com um diretório configurado, os vetores também são gravados em segmentos
+append-only (`seg_NNNNNN.f32` + `seg_NNNNNN.ids`). Ao reiniciar, os segmentos
+existentes são abertos com `numpy.memmap`: nada é re-calculado e as páginas
+só são carregadas quando uma busca as toca.
+
+Quantização (`float16` ou `int8` com escala por dimensão): a busca pontua os
+candidatos sobre a matriz comprimida (`.f16` / `.i8`) e re-pontua os melhores
+com os vetores float32 exatos, lidos do disco apenas para esses candidatos.
+"""
+
+import json
+import shutil
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+META_FILE = "meta.json"
+QUANTIZATIONS = {None: np.float32, "float16": np.float16, "int8": np.int8}
+SUFFIXES = {"float16": ".f16", "int8": ".i8"}
+
+# Linhas convertidas para float32 por vez ao pontuar matrizes comprimidas
+SCORE_BLOCK_ROWS = 65536
+# Consultas pontuadas juntas em search_many (a matriz de scores tem linhas × consultas)
+QUERY_BLOCK_COLUMNS = 32
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Normalizar vetores (L2) linha a linha, ignorando vetores nulos"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorStore:
+    """Matriz de embeddings de um índice, normalizados no momento da escrita"""
+
+    def __init__(self, dim: int, directory: Optional[Path] = None, model: str = "",
+                 quantization: Optional[str] = None, rescore_factor: int = 4,
+                 initial_capacity: int = 1024, segment_rows: int = 65536):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Quantização inválida: {quantization} (use float16 ou int8)")
+
+        self.dim = dim
+        self.model = model
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.directory = Path(directory) if directory is not None else None
+        self.segment_rows = segment_rows
+        self.dtype = QUANTIZATIONS[quantization]
+        # Escala por dimensão do int8 (calibrada no primeiro lote gravado)
+        self.scales: Optional[np.ndarray] = None
+
+        # Segmentos persistidos em execuções anteriores (somente leitura, mapeados)
+        self._segments = []
+        self._frozen_ids = np.zeros(0, dtype=np.int64)
+
+        # Vetores adicionados nesta execução (no dtype de armazenamento)
+        self._matrix = np.zeros((initial_capacity, dim), dtype=self.dtype)
+        self._ids = np.zeros(initial_capacity, dtype=np.int64)
+        self._size = 0
+        # Linha de cada id de chunk (-1: sem vetor); os ids são inteiros densos (ChunkTable), então um
+        # array indexado pelo id basta. Com ids repetidos (linhas obsoletas), vale a última linha.
+        self._rows = np.zeros(0, dtype=np.int64)
+        # Sem diretório não há float32 em disco para re-pontuar: manter cópia exata em memória
+        self._exact = np.zeros((initial_capacity, dim), dtype=np.float32) \
+            if quantization and self.directory is None else None
+
+        # Segmentos append-only desta execução: [(caminho base, linhas)]
+        self._live_files = []
+        self._live_maps = {}
+
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._write_meta()
+
+    @classmethod
+    def open(cls, directory: Path, model: str = "") -> Optional["VectorStore"]:
+        """Abrir segmentos existentes via memmap; None se não houver (ou se o modelo mudou)"""
+        directory = Path(directory)
+        meta_path = directory / META_FILE
+        if not meta_path.exists():
+            return None
+
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if model and meta.get("model") and meta["model"] != model:
+            # Embeddings de outro modelo não são comparáveis - descartar
+            shutil.rmtree(directory, ignore_errors=True)
+            return None
+
+        store = cls(meta["dim"], directory=directory, model=model or meta.get("model", ""),
+                    quantization=meta.get("quantization"), rescore_factor=meta.get("rescore_factor", 4))
+        if meta.get("scales") is not None:
+            store.scales = np.asarray(meta["scales"], dtype=np.float32)
+        store._map_segments()
+        return store
+
+    def _write_meta(self):
+        meta = {
+            "dim": self.dim,
+            "model": self.model,
+            "dtype": "float32",
+            "quantization": self.quantization,
+            "rescore_factor": self.rescore_factor,
+            "scales": self.scales.tolist() if self.scales is not None else None,
+        }
+        with open(self.directory / META_FILE, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    def _row_count(self, base: Path) -> int:
+        """Linhas completas de um segmento (uma escrita interrompida pode deixar uma linha parcial)"""
+        paths = [(base.with_suffix(".f32"), self.dim * 4), (base.with_suffix(".ids"), 8)]
+        if self.quantization:
+            paths.append((base.with_suffix(SUFFIXES[self.quantization]), self.dim * np.dtype(self.dtype).itemsize))
+        if not all(path.exists() for path, _ in paths):
+            return 0
+        return min(path.stat().st_size // row_bytes for path, row_bytes in paths)
+
+    def _map_segments(self):
+        """Mapear em memória os segmentos gravados no diretório"""
+        ids = []
+        for vectors_path in sorted(self.directory.glob("seg_*.f32")):
+            base = vectors_path.with_suffix("")
+            rows = self._row_count(base)
+            if rows == 0:
+                continue
+
+            exact = np.memmap(vectors_path, dtype=np.float32, mode='r', shape=(rows, self.dim))
+            compressed = None
+            if self.quantization:
+                compressed = np.memmap(base.with_suffix(SUFFIXES[self.quantization]), dtype=self.dtype,
+                                       mode='r', shape=(rows, self.dim))
+            self._segments.append((exact, compressed))
+            ids.append(np.fromfile(base.with_suffix(".ids"), dtype=np.int64, count=rows))
+
+        if ids:
+            self._frozen_ids = np.concatenate(ids)
+            self._map_rows(self._frozen_ids, 0)
+
+    def __len__(self):
+        return len(self._frozen_ids) + self._size
+
+    def ids(self) -> np.ndarray:
+        """Todos os ids de chunk armazenados"""
+        return np.concatenate([self._frozen_ids, self._ids[:self._size]])
+
+    def _map_rows(self, ids: np.ndarray, start: int):
+        """Registrar as linhas `start`, `start + 1`, ... dos `ids` no mapa id → linha"""
+        if len(ids) == 0:
+            return
+        needed = int(ids.max()) + 1
+        if needed > len(self._rows):
+            rows = np.full(max(needed, 2 * len(self._rows), 1024), -1, dtype=np.int64)
+            rows[:len(self._rows)] = self._rows
+            self._rows = rows
+        self._rows[ids] = np.arange(start, start + len(ids))
+
+    def _reserve(self, extra: int):
+        """Garantir capacidade para mais `extra` linhas (crescimento geométrico)"""
+        needed = self._size + extra
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+
+        while capacity < needed:
+            capacity *= 2
+
+        matrix = np.zeros((capacity, self.dim), dtype=self.dtype)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._ids = matrix, ids
+
+        if self._exact is not None:
+            exact = np.zeros((capacity, self.dim), dtype=np.float32)
+            exact[:self._size] = self._exact[:self._size]
+            self._exact = exact
+
+    def _compress(self, vectors: np.ndarray) -> np.ndarray:
+        """Converter vetores float32 normalizados para o dtype de armazenamento"""
+        if self.quantization == "float16":
+            return vectors.astype(np.float16)
+        if self.quantization == "int8":
+            if self.scales is None:
+                # Calibrar a escala por dimensão com folga de 20% (valores maiores são saturados);
+                # o piso de 4/sqrt(dim) evita escalas estreitas demais quando o primeiro lote é pequeno
+                floor = 4 / np.sqrt(self.dim)
+                self.scales = np.clip(np.abs(vectors).max(axis=0) * 1.2, floor, 1.0).astype(np.float32)
+                if self.directory is not None:
+                    self._write_meta()
+            return np.clip(np.rint(vectors / self.scales * 127), -127, 127).astype(np.int8)
+        return vectors
+
+    def add(self, ids, vectors):
+        """Adicionar vetores identificados por `ids` (ids de chunk)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Dimensão do embedding ({vectors.shape[1]}) difere do índice ({self.dim})")
+
+        count = vectors.shape[0]
+        vectors = normalize_rows(vectors).astype(np.float32)
+        compressed = self._compress(vectors)
+        ids = np.asarray(ids, dtype=np.int64)
+
+        self._reserve(count)
+        self._map_rows(ids, len(self))
+        self._matrix[self._size:self._size + count] = compressed
+        self._ids[self._size:self._size + count] = ids
+        if self._exact is not None:
+            self._exact[self._size:self._size + count] = vectors
+        self._size += count
+
+        if self.directory is not None:
+            self._append(ids, vectors, compressed)
+
+    def _append(self, ids: np.ndarray, vectors: np.ndarray, compressed: np.ndarray):
+        """Acrescentar linhas ao segmento ativo no disco"""
+        if not self._live_files or self._live_files[-1][1] >= self.segment_rows:
+            existing = sorted(self.directory.glob("seg_*.f32"))
+            number = int(existing[-1].stem.split("_")[1]) + 1 if existing else 1
+            self._live_files.append((self.directory / f"seg_{number:06d}", 0))
+
+        base, rows = self._live_files[-1]
+        # Ids por último: uma linha só é válida quando todos os arquivos a contêm
+        with open(base.with_suffix(".f32"), 'ab') as f:
+            f.write(vectors.tobytes())
+        if self.quantization:
+            with open(base.with_suffix(SUFFIXES[self.quantization]), 'ab') as f:
+                f.write(compressed.tobytes())
+        with open(base.with_suffix(".ids"), 'ab') as f:
+            f.write(ids.tobytes())
+        self._live_files[-1] = (base, rows + len(ids))
+
+    def _prepare_query(self, query: np.ndarray) -> np.ndarray:
+        """Ajustar a consulta para o produto escalar com a matriz comprimida"""
+        if self.quantization == "int8":
+            return query * (self.scales / 127)
+        return query
+
+    def _score(self, matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Scores de uma matriz (float32 direto; comprimida convertida em blocos).
+        `query` pode ser um vetor (dim,) ou várias consultas em colunas (dim, m)."""
+        if matrix.dtype == np.float32:
+            return matrix @ query
+        scores = np.empty((len(matrix),) + query.shape[1:], dtype=np.float32)
+        for start in range(0, len(matrix), SCORE_BLOCK_ROWS):
+            block = matrix[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        return scores
+
+    def search(self, query, k: int, ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Retornar (ids, scores) dos `k` vetores mais similares (cosseno).
+        Com `ids`, só as linhas desses ids são pontuadas (candidatos já filtrados): o custo acompanha o
+        número de candidatos, não o tamanho do índice."""
+        total = len(self)
+        if total == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query = normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        if ids is not None:
+            positions = self._positions_of(np.asarray(ids, dtype=np.int64))
+            k = min(len(positions), k)
+            if k == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            scores = self.vectors_at(positions) @ query
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+            order = top[np.argsort(-scores[top])]
+            return self.ids_at(positions[order]), scores[order]
+
+        return self._select(self._score_all(self._prepare_query(query)), query, k)
+
+    def search_many(self, queries, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """`search` de várias consultas: um produto matriz-matriz por bloco de consultas
+        (a matriz é lida uma vez por bloco, não uma vez por consulta)"""
+        queries = np.asarray(queries, dtype=np.float32).reshape(len(queries), -1)
+        if len(self) == 0 or k <= 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+
+        queries = normalize_rows(queries)
+        results = []
+        for start in range(0, len(queries), QUERY_BLOCK_COLUMNS):
+            block = queries[start:start + QUERY_BLOCK_COLUMNS]
+            # Consultas em colunas: scores (linhas, consultas); transposto para ler cada consulta contígua
+            scores = np.ascontiguousarray(self._score_all(self._prepare_query(block).T).T)
+            results.extend(self._select(scores[j], block[j], k) for j in range(len(block)))
+        return results
+
+    def _score_all(self, prepared: np.ndarray) -> np.ndarray:
+        """Scores de todas as linhas (segmentos mapeados + linhas desta execução)"""
+        parts = [self._score(compressed if compressed is not None else exact, prepared)
+                 for exact, compressed in self._segments]
+        parts.append(self._score(self._matrix[:self._size], prepared))
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    def _select(self, scores: np.ndarray, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k de um vetor de scores (seleção parcial; re-pontuação exata com quantização)"""
+        total = len(scores)
+        k = min(total, k)
+        # Com quantização, selecionar mais candidatos e re-pontuar com os vetores exatos
+        candidates = min(total, k * self.rescore_factor) if self.quantization else k
+        if candidates < total:
+            top = np.argpartition(-scores, candidates - 1)[:candidates]
+        else:
+            top = np.arange(total)
+        top_scores = self.vectors_at(top) @ query if self.quantization else scores[top]
+        order = np.argsort(-top_scores)[:k]
+
+        return self.ids_at(top[order]), top_scores[order]
+
+    def _positions_of(self, ids: np.ndarray) -> np.ndarray:
+        """Linhas (ordenadas, sem repetição) dos `ids` que têm vetor"""
+        ids = ids[(ids >= 0) & (ids < len(self._rows))]
+        positions = self._rows[ids]
+        return np.unique(positions[positions >= 0])
+
+    def ids_at(self, positions: np.ndarray) -> np.ndarray:
+        """Converter posições de linha em ids de chunk"""
+        frozen = len(self._frozen_ids)
+        if frozen == 0:
+            return self._ids[positions]
+        ids = np.empty(len(positions), dtype=np.int64)
+        in_frozen = positions < frozen
+        ids[in_frozen] = self._frozen_ids[positions[in_frozen]]
+        ids[~in_frozen] = self._ids[positions[~in_frozen] - frozen]
+        return ids
+
+    def _live_exact(self, positions: np.ndarray) -> np.ndarray:
+        """Vetores float32 exatos de linhas desta execução"""
+        if not self.quantization:
+            return self._matrix[positions]
+        if self._exact is not None:
+            return self._exact[positions]
+
+        # Ler do segmento float32 no disco (mapeamento refeito quando o arquivo cresce)
+        vectors = np.empty((len(positions), self.dim), dtype=np.float32)
+        start = 0
+        for base, rows in self._live_files:
+            mask = (positions >= start) & (positions < start + rows)
+            if mask.any():
+                cached = self._live_maps.get(base)
+                if cached is None or len(cached) != rows:
+                    cached = np.memmap(base.with_suffix(".f32"), dtype=np.float32, mode='r', shape=(rows, self.dim))
+                    self._live_maps[base] = cached
+                vectors[mask] = cached[positions[mask] - start]
+            start += rows
+        return vectors
+
+    def vectors_at(self, positions) -> np.ndarray:
+        """Vetores float32 exatos (normalizados) nas posições de linha `positions`"""
+        positions = np.asarray(positions, dtype=np.int64)
+        if not self._segments:
+            return self._live_exact(positions)
+
+        vectors = np.empty((len(positions), self.dim), dtype=np.float32)
+        start = 0
+        for exact, _ in self._segments:
+            mask = (positions >= start) & (positions < start + len(exact))
+            if mask.any():
+                vectors[mask] = exact[positions[mask] - start]
+            start += len(exact)
+        in_live = positions >= start
+        if in_live.any():
+            vectors[in_live] = self._live_exact(positions[in_live] - start)
+        return vectors
+
+    def memory_bytes(self) -> int:
+        """Memória residente ocupada pela matriz em RAM e pelos ids"""
+        total = self._matrix.nbytes + self._ids.nbytes + self._frozen_ids.nbytes + self._rows.nbytes
+        if self._exact is not None:
+            total += self._exact.nbytes
+        return total
+
+    def mapped_bytes(self) -> int:
+        """Bytes de segmentos mapeados do disco (carregados sob demanda)"""
+        return sum(exact.nbytes + (compressed.nbytes if compressed is not None else 0)
+                   for exact, compressed in self._segments)
+
+    def scored_bytes(self) -> int:
+        """Bytes lidos por uma busca exaustiva (matriz usada na pontuação)"""
+        itemsize = np.dtype(self.dtype).itemsize
+        return len(self) * self.dim * itemsize
+
+    def compacted(self, positions: np.ndarray, directory: Optional[Path] = None) -> "VectorStore":
+        """Nova store só com as linhas `positions` (na mesma ordem), com os mesmos parâmetros e
+        escalas; usada para descartar as linhas de chunks removidos"""
+        store = VectorStore(self.dim, directory=directory, model=self.model, quantization=self.quantization,
+                            rescore_factor=self.rescore_factor, segment_rows=self.segment_rows)
+        store.scales = self.scales
+        if directory is not None:
+            store._write_meta()
+        positions = np.asarray(positions, dtype=np.int64)
+        for start in range(0, len(positions), SCORE_BLOCK_ROWS):
+            block = positions[start:start + SCORE_BLOCK_ROWS]
+            store.add(self.ids_at(block), self.vectors_at(block))
+        return store
+
+    def destroy(self):
+        """Remover os segmentos do disco"""
+        self._segments = []
+        self._live_maps = {}
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,237 @@
+"""
+Log de escrita antecipada (write-ahead log) do Agno RAG
+Toda mutação (criar índice, gravar documentos, remover índice) vira uma linha JSON acrescentada
+ao segmento ativo do log. O commit é em grupo: as linhas acumuladas em `flush_interval_ms`
+(ou até `max_batch` registros) são gravadas com um único fsync; a janela só é aplicada
+enquanto há escritores concorrentes.
+O compactador aplica os segmentos fechados ao armazenamento principal (SQLite) e os apaga;
+na inicialização, os segmentos que sobraram de um encerramento abrupto são reaplicados.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from documents import StoredDocument
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".jsonl"
+
+
+def _encode(value: Any) -> Any:
+    """Serializar objetos que o json não conhece (documentos)"""
+    if isinstance(value, StoredDocument):
+        return value.to_record()
+    raise TypeError(f"Objeto não serializável no log: {type(value).__name__}")
+
+
+def read_segment(path: Path) -> List[Dict[str, Any]]:
+    """Registros de um segmento; uma última linha incompleta (gravação interrompida) é descartada"""
+    records = []
+    with open(path, "rb") as file:
+        lines = file.read().split(b"\n")
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            if any(rest.strip() for rest in lines[number:]):
+                raise ValueError(f"Registro corrompido em {path.name}, linha {number}")
+            logger.warning(f"Registro incompleto descartado no fim de {path.name} (linha {number})")
+    return records
+
+
+class WriteAheadLog:
+    """Log append-only em segmentos numerados, com commit em grupo"""
+
+    def __init__(self, directory: Path, flush_interval_ms: float = 10.0, max_batch: int = 256,
+                 compact_bytes: int = 64 * 1024 * 1024, executor: Optional[ThreadPoolExecutor] = None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.compact_bytes = compact_bytes
+        # Um único worker: as gravações (e a troca de segmento) ficam na ordem de chegada
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="agno-wal")
+
+        segments = self.segments()
+        self._segment_number = int(segments[-1].stem) + 1 if segments else 1
+        self._file = None
+        self._segment_bytes = 0
+        self._sequence = 0
+
+        self._queue: Deque[Tuple[Dict[str, Any], asyncio.Future]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._writing = False
+        self._last_group = 0
+        self._compact_needed: Optional[asyncio.Event] = None
+        self._compact_lock: Optional[asyncio.Lock] = None
+        self._compactor: Optional[asyncio.Task] = None
+
+        self.records = 0
+        self.flushes = 0
+        self.compactions = 0
+
+    def segments(self) -> List[Path]:
+        """Segmentos no disco, do mais antigo ao mais novo"""
+        return sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}"), key=lambda path: int(path.stem))
+
+    def _active_path(self) -> Path:
+        return self.directory / f"{self._segment_number:08d}{SEGMENT_SUFFIX}"
+
+    async def append(self, record: Dict[str, Any]):
+        """Acrescentar um registro; retorna depois que ele estiver em disco (fsync)"""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = loop.create_task(self._run())
+
+        future = loop.create_future()
+        self._queue.append((record, future))
+        self._wakeup.set()
+        await future
+
+    async def _run(self):
+        """Loop do worker: juntar registros durante a janela de commit e gravar com um fsync"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._queue:
+                continue
+
+            # Só vale esperar a janela se há escritores concorrentes (o grupo anterior teve mais
+            # de um registro); um escritor sequencial grava na hora. Sem espera, os registros que
+            # chegam durante um fsync formam o grupo seguinte.
+            deadline = loop.time() + (self.flush_interval if self._last_group > 1 else 0)
+            while len(self._queue) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                self._wakeup.clear()
+
+            batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch))]
+            self._last_group = len(batch)
+            self._writing = True
+            try:
+                await loop.run_in_executor(self.executor, self._write, [record for record, _ in batch])
+            except Exception as e:
+                logger.error(f"Erro ao gravar no log ({len(batch)} registros): {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                self.flushes += 1
+                self.records += len(batch)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+            finally:
+                self._writing = False
+            if self._segment_bytes >= self.compact_bytes and self._compact_needed is not None:
+                self._compact_needed.set()
+
+            if self._queue:
+                self._wakeup.set()
+
+    def _write(self, records: List[Dict[str, Any]]):
+        """Gravar as linhas no segmento ativo e sincronizar (roda na thread do log)"""
+        lines = []
+        for record in records:
+            self._sequence += 1
+            lines.append(json.dumps({"seq": self._sequence, **record}, ensure_ascii=False, default=_encode))
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+
+        if self._file is None:
+            self._file = open(self._active_path(), "ab")
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._segment_bytes += len(data)
+
+    def _rotate(self) -> List[Path]:
+        """Fechar o segmento ativo; retorna os segmentos fechados (roda na thread do log)"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._segment_bytes = 0
+            self._segment_number += 1
+        active = self._active_path()
+        return [path for path in self.segments() if path != active]
+
+    async def compact(self, apply: Callable[[List[Dict[str, Any]]], Awaitable[None]]) -> int:
+        """Aplicar os segmentos fechados ao armazenamento principal e apagá-los.
+        `apply` recebe os registros de um segmento e deve gravá-los numa única transação
+        (reaplicar um segmento inteiro é idempotente, então uma queda no meio é segura)."""
+        if self._compact_lock is None:
+            self._compact_lock = asyncio.Lock()
+        async with self._compact_lock:
+            loop = asyncio.get_running_loop()
+            segments = await loop.run_in_executor(self.executor, self._rotate)
+            applied = 0
+            for segment in segments:
+                records = await loop.run_in_executor(None, read_segment, segment)
+                if records:
+                    await apply(records)
+                segment.unlink()
+                applied += len(records)
+            if segments:
+                self.compactions += 1
+                logger.info(f"Log compactado: {applied} registros de {len(segments)} segmento(s) aplicados")
+            return applied
+
+    def start_compactor(self, apply: Callable[[List[Dict[str, Any]]], Awaitable[None]], interval: float):
+        """Compactar periodicamente (ou quando o segmento ativo passar de `compact_bytes`)"""
+        self._compact_needed = asyncio.Event()
+        self._compactor = asyncio.get_running_loop().create_task(self._run_compactor(apply, interval))
+
+    async def _run_compactor(self, apply: Callable[[List[Dict[str, Any]]], Awaitable[None]], interval: float):
+        while True:
+            try:
+                await asyncio.wait_for(self._compact_needed.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self._compact_needed.clear()
+            try:
+                await self.compact(apply)
+            except Exception as e:
+                # Os segmentos continuam no disco; a próxima rodada tenta de novo
+                logger.error(f"Erro ao compactar o log: {e}")
+
+    async def close(self, apply: Optional[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = None):
+        """Esperar os registros pendentes, parar o compactador e (opcionalmente) compactar tudo"""
+        while self._queue or self._writing:
+            await asyncio.sleep(self.flush_interval)
+        if self._compactor is not None:
+            self._compactor.cancel()
+            self._compactor = None
+        if apply is not None:
+            await self.compact(apply)
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        await asyncio.get_running_loop().run_in_executor(self.executor, self._rotate)
+        self.executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "records": self.records,
+            "flushes": self.flushes,
+            "avg_group_size": round(self.records / self.flushes, 2) if self.flushes else 0.0,
+            "queued": len(self._queue),
+            "segments": len(self.segments()),
+            "active_segment_bytes": self._segment_bytes,
+            "compactions": self.compactions,
+        }
@@ -72,7 +72,7 @@ router.post('/initialize', async (req, res) => {
 // Salvar projeto no RAG
 router.post('/save-project', async (req, res) => {
   try {
-    const { endpoint, apiKey, indexName, project } = req.body;
+    const { endpoint, apiKey, indexName, project, projectId = project.id } = req.body;
     
     const documentId = `project_${uuidv4()}`;
     
@@ -82,6 +82,7 @@ router.post('/save-project', async (req, res) => {
       content: JSON.stringify(project, null, 2),
       metadata: {
         type: 'project',
+        project_id: projectId,
         title: project.title,
         topic: project.topic || '',
         audience: project.audience || '',
@@ -113,13 +114,15 @@ router.post('/save-project', async (req, res) => {
 // Buscar no RAG
 router.post('/search', async (req, res) => {
   try {
-    const { endpoint, apiKey, indexName, query, limit = 5 } = req.body;
+    const { endpoint, apiKey, indexName, query, limit = 5, cursor } = req.body;
     
+    // cursor: nextCursor da página anterior (páginas seguintes da mesma busca)
     const response = await axios.post(`${endpoint}/search`, {
       index: indexName,
       query,
       limit,
-      include_metadata: true
+      include_metadata: true,
+      ...(cursor ? { cursor } : {})
     }, {
       headers: {
         'Content-Type': 'application/json',
@@ -129,7 +132,8 @@ router.post('/search', async (req, res) => {
     
     res.json({ 
       success: true, 
-      results: response.data.results 
+      results: response.data.results,
+      nextCursor: response.data.next_cursor || null
     });
     
   } catch (error) {
@@ -155,7 +159,8 @@ router.post('/save-chapter', async (req, res) => {
       metadata: {
         type: 'chapter',
         project_id: projectId,
-        chapter_id: chapter.id,
+        // Sempre string: o id vem numérico do roteiro e como string dos parâmetros de rota
+        chapter_id: String(chapter.id),
         title: chapter.title,
         status: chapter.status,
         created_at: new Date().toISOString()
@@ -183,42 +188,53 @@ router.post('/save-chapter', async (req, res) => {
 });
 
 // Obter contexto do RAG para geração de capítulo
+// Com chapterIds (lista), traz o contexto de todos os capítulos do roteiro numa única chamada
 router.post('/get-context', async (req, res) => {
   try {
-    const { endpoint, apiKey, indexName, projectId, chapterId } = req.body;
-    
-    // Buscar contexto relacionado ao projeto e capítulo
-    const searchQueries = [
-      `project_id:${projectId}`,
-      `chapter_id:${chapterId}`,
-      `type:project`
+    const { endpoint, apiKey, indexName, projectId, chapterId, chapterIds } = req.body;
+    
+    // Buscar contexto relacionado ao projeto e capítulo (filtros de metadados, sem texto de consulta)
+    const chapters = chapterIds || [chapterId];
+    // chapter_id é gravado como string (save-chapter): o filtro distingue 1 de "1"
+    const searchFilters = [
+      { project_id: projectId },
+      { type: 'project', project_id: projectId },
+      ...chapters.map(id => ({ project_id: projectId, chapter_id: String(id) }))
     ];
     
-    const contextResults = [];
-    
-    for (const query of searchQueries) {
-      try {
-        const response = await axios.post(`${endpoint}/search`, {
+    let batchResults = [];
+    try {
+      const response = await axios.post(`${endpoint}/search/batch`, {
+        searches: searchFilters.map(filters => ({
           index: indexName,
-          query,
+          query: '',
+          filters,
           limit: 3,
           include_metadata: true
-        }, {
-          headers: {
-            'Content-Type': 'application/json',
-            ...(apiKey ? { 'Authorization': `Bearer ${apiKey}` } : {})
-          }
-        });
-        
-        contextResults.push(...response.data.results);
-      } catch (searchError) {
-        console.warn('Erro em busca específica:', searchError.message);
-      }
+        }))
+      }, {
+        headers: {
+          'Content-Type': 'application/json',
+          ...(apiKey ? { 'Authorization': `Bearer ${apiKey}` } : {})
+        }
+      });
+      batchResults = response.data.results.map(result => {
+        if (!result.success) {
+          console.warn('Erro em busca específica:', result.error);
+        }
+        return result.success ? result.results : [];
+      });
+    } catch (searchError) {
+      console.warn('Erro na busca de contexto:', searchError.message);
     }
     
+    const [projectResults = [], typeResults = [], ...chapterResults] = batchResults;
+    const contextFor = (index) => [...projectResults, ...(chapterResults[index] || []), ...typeResults];
+    
     res.json({ 
       success: true, 
-      context: contextResults 
+      context: contextFor(0),
+      ...(chapterIds ? { contexts: Object.fromEntries(chapters.map((id, index) => [id, contextFor(index)])) } : {})
     });
     
   } catch (error) {
@@ -0,0 +1,104 @@
+import { test, before, after } from 'node:test';
+import assert from 'node:assert/strict';
+import http from 'node:http';
+import express from 'express';
+import ragRoutes from './rag.js';
+
+// Serviço Agno de teste: guarda os documentos e responde /search/batch com os filtros de igualdade
+// de metadados do Agno (filters.value_key: 1 e "1" são valores diferentes), mais recentes primeiro
+const documents = [];
+
+const sameValue = (a, b) => (
+  typeof a === 'number' && typeof b === 'number' ? a === b : typeof a === typeof b && a === b
+);
+
+const matches = (metadata, filters) => (
+  Object.entries(filters).every(([field, value]) => sameValue(metadata[field], value))
+);
+
+const agno = http.createServer((req, res) => {
+  let body = '';
+  req.on('data', chunk => { body += chunk; });
+  req.on('end', () => {
+    const request = JSON.parse(body || '{}');
+    let response = { success: true };
+    if (req.url === '/documents') {
+      documents.unshift(request);
+    } else if (req.url === '/search/batch') {
+      response.results = request.searches.map(search => ({
+        success: true,
+        results: documents
+          .filter(document => matches(document.metadata, search.filters))
+          .slice(0, search.limit)
+          .map(document => ({ document_id: document.document_id, content: document.content, metadata: document.metadata }))
+      }));
+    }
+    res.setHeader('Content-Type', 'application/json');
+    res.end(JSON.stringify(response));
+  });
+});
+
+let server;
+let baseUrl;
+let agnoUrl;
+
+const listen = (target) => new Promise(resolve => {
+  const instance = target.listen(0, '127.0.0.1', () => resolve(instance));
+});
+
+const post = async (path, body) => {
+  const response = await fetch(`${baseUrl}/api/rag${path}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body)
+  });
+  assert.equal(response.status, 200);
+  return response.json();
+};
+
+before(async () => {
+  await listen(agno);
+  agnoUrl = `http://127.0.0.1:${agno.address().port}`;
+  const app = express();
+  app.use(express.json());
+  app.use('/api/rag', ragRoutes);
+  server = await listen(app);
+  baseUrl = `http://127.0.0.1:${server.address().port}`;
+});
+
+after(() => {
+  server.close();
+  agno.close();
+});
+
+test('get-context traz o capítulo salvo por save-chapter', async () => {
+  const config = { endpoint: agnoUrl, indexName: 'ebook-projects', projectId: 'p1' };
+  // O roteiro gera ids numéricos; o capítulo 1 é salvo primeiro e os demais ocupam
+  // os resultados da busca só por projeto (limite 3)
+  for (const id of [1, 2, 3, 4]) {
+    await post('/save-chapter', {
+      ...config,
+      chapter: { id, title: `Capítulo ${id}`, description: 'Descrição', content: `Texto do capítulo ${id}`, status: 'done' }
+    });
+  }
+
+  // Como em projects.js: chapterId vem de req.params (string)
+  const { context } = await post('/get-context', { ...config, chapterId: '1' });
+  assert.ok(context.some(result => result.document_id === 'chapter_p1_1'));
+
+  const { contexts } = await post('/get-context', { ...config, chapterIds: [1, '2'] });
+  assert.ok(contexts['1'].some(result => result.document_id === 'chapter_p1_1'));
+  assert.ok(contexts['2'].some(result => result.document_id === 'chapter_p1_2'));
+});
+
+test('get-context traz só o projeto pedido', async () => {
+  const config = { endpoint: agnoUrl, indexName: 'ebook-projects' };
+  // O projeto salvo por último (p3) seria o primeiro resultado de um filtro só por tipo
+  for (const id of ['p2', 'p3']) {
+    await post('/save-project', { ...config, project: { id, title: `Projeto ${id}`, chapters: [] } });
+  }
+
+  const { context } = await post('/get-context', { ...config, projectId: 'p2', chapterId: '1' });
+  assert.ok(context.some(result => result.metadata.type === 'project'));
+  assert.ok(context.every(result => result.metadata.project_id === 'p2'));
+});